@@ -0,0 +1,31 @@
+"""add trigram index on image tag names
+
+Revision ID: 03ec5ffd5fcd
+Revises: 4261ac2ea05a
+Create Date: 2026-10-15 11:02:17.334871
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "03ec5ffd5fcd"
+down_revision: Union[str, None] = "4261ac2ea05a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # expression index, tag_name is citext and gin_trgm_ops is defined for
+    # text, queries filter on tag_name::text ILIKE '%...%'
+    op.execute(
+        "CREATE INDEX ix_image_tags_tag_name_trgm ON image_tags "
+        "USING gin ((tag_name::text) gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_tags_tag_name_trgm", table_name="image_tags")
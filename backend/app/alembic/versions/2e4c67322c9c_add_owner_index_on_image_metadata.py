@@ -0,0 +1,31 @@
+"""add owner index on image metadata
+
+Revision ID: 2e4c67322c9c
+Revises: dda3ee8477f1
+Create Date: 2026-10-15 15:41:52.204816
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2e4c67322c9c"
+down_revision: Union[str, None] = "dda3ee8477f1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # description and color filters select metadata of one owner
+    op.create_index(
+        "ix_image_metadata_user_id",
+        "image_metadata",
+        ["user_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_metadata_user_id", table_name="image_metadata")
@@ -0,0 +1,33 @@
+"""add hnsw index on image color vectors
+
+Revision ID: 4261ac2ea05a
+Revises: f464d8e1c488
+Create Date: 2026-10-15 10:12:41.508214
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4261ac2ea05a"
+down_revision: Union[str, None] = "f464d8e1c488"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # tag_vec has 4096 dimensions, above the 2000 hnsw supports for vector
+    op.create_index(
+        "ix_image_metadata_color_vec",
+        "image_metadata",
+        ["color_vec"],
+        unique=False,
+        postgresql_using="hnsw",
+        postgresql_ops={"color_vec": "vector_ip_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_metadata_color_vec", table_name="image_metadata")
@@ -0,0 +1,75 @@
+"""store image vectors as halfvec
+
+Revision ID: 7b1e9c4d2a63
+Revises: 2e4c67322c9c
+Create Date: 2026-10-15 17:05:18.342871
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+from pgvector.sqlalchemy import HALFVEC, Vector
+
+# revision identifiers, used by Alembic.
+revision: str = "7b1e9c4d2a63"
+down_revision: Union[str, None] = "2e4c67322c9c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # halfvec needs pgvector >= 0.7, the hnsw index is rebuilt for the new type
+    op.drop_index("ix_image_metadata_color_vec", table_name="image_metadata")
+    op.alter_column(
+        "image_metadata",
+        "tag_vec",
+        existing_type=Vector(dim=4096),
+        type_=HALFVEC(dim=4096),
+        existing_nullable=True,
+        postgresql_using="tag_vec::halfvec(4096)",
+    )
+    op.alter_column(
+        "image_metadata",
+        "color_vec",
+        existing_type=Vector(dim=12),
+        type_=HALFVEC(dim=12),
+        existing_nullable=True,
+        postgresql_using="color_vec::halfvec(12)",
+    )
+    op.create_index(
+        "ix_image_metadata_color_vec",
+        "image_metadata",
+        ["color_vec"],
+        unique=False,
+        postgresql_using="hnsw",
+        postgresql_ops={"color_vec": "halfvec_ip_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_metadata_color_vec", table_name="image_metadata")
+    op.alter_column(
+        "image_metadata",
+        "color_vec",
+        existing_type=HALFVEC(dim=12),
+        type_=Vector(dim=12),
+        existing_nullable=True,
+        postgresql_using="color_vec::vector(12)",
+    )
+    op.alter_column(
+        "image_metadata",
+        "tag_vec",
+        existing_type=HALFVEC(dim=4096),
+        type_=Vector(dim=4096),
+        existing_nullable=True,
+        postgresql_using="tag_vec::vector(4096)",
+    )
+    op.create_index(
+        "ix_image_metadata_color_vec",
+        "image_metadata",
+        ["color_vec"],
+        unique=False,
+        postgresql_using="hnsw",
+        postgresql_ops={"color_vec": "vector_ip_ops"},
+    )
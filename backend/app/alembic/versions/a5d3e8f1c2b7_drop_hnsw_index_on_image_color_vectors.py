@@ -0,0 +1,34 @@
+"""drop hnsw index on image color vectors
+
+Revision ID: a5d3e8f1c2b7
+Revises: 7b1e9c4d2a63
+Create Date: 2026-10-15 19:12:40.518203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a5d3e8f1c2b7"
+down_revision: Union[str, None] = "7b1e9c4d2a63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the color filter is an inner product threshold in WHERE, hnsw only
+    # serves ORDER BY ... LIMIT nearest neighbour scans so it was never used
+    op.drop_index("ix_image_metadata_color_vec", table_name="image_metadata")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_image_metadata_color_vec",
+        "image_metadata",
+        ["color_vec"],
+        unique=False,
+        postgresql_using="hnsw",
+        postgresql_ops={"color_vec": "halfvec_ip_ops"},
+    )
@@ -0,0 +1,47 @@
+"""add lookup indexes on images and metadata
+
+Revision ID: dda3ee8477f1
+Revises: 03ec5ffd5fcd
+Create Date: 2026-10-15 13:24:08.917342
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "dda3ee8477f1"
+down_revision: Union[str, None] = "03ec5ffd5fcd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # image listing filters on the owner and pages newest first
+    op.create_index(
+        "ix_images_user_id_uploaded_at",
+        "images",
+        ["user_id", sa.text("uploaded_at DESC")],
+        unique=False,
+    )
+    # one metadata row per image, image_tags and image_colors already lead
+    # their primary keys with image_id
+    op.create_index(
+        "ix_image_metadata_image_id",
+        "image_metadata",
+        ["image_id"],
+        unique=True,
+    )
+    # pg_trgm is created by 03ec5ffd5fcd, backs description ILIKE '%...%'
+    op.execute(
+        "CREATE INDEX ix_image_metadata_description_trgm ON image_metadata "
+        "USING gin (description gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_metadata_description_trgm", table_name="image_metadata")
+    op.drop_index("ix_image_metadata_image_id", table_name="image_metadata")
+    op.drop_index("ix_images_user_id_uploaded_at", table_name="images")
@@ -1,21 +1,15 @@
 from typing import Annotated
 
 from fastapi import Depends
-from sqlmodel import Session
-from supabase._async.client import AsyncClient
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.auth import get_current_user, get_super_client
-from app.core.config import settings
+from app.core.auth import SuperClient, get_current_user
 from app.core.db import get_db
 from app.schemas.auth import UserIn
-from app.services.everypixel import EveryPixelService
+from app.services.everypixel import EveryPixelService, get_everypixel
 
 CurrentUser = Annotated[UserIn, Depends(get_current_user)]
-SessionDep = Annotated[Session, Depends(get_db)]
-SuperClient = Annotated[AsyncClient, Depends(get_super_client)]
+SessionDep = Annotated[AsyncSession, Depends(get_db)]
+EveryPixel = Annotated[EveryPixelService, Depends(get_everypixel)]
 
-everypixel = EveryPixelService(
-    base_url=settings.EVERYPIXEL_API_BASE_URL,
-    client_id=settings.EVERYPIXEL_CLIENT_ID,
-    client_secret=settings.EVERYPIXEL_CLIENT_SECRET,
-)
+__all__ = ["CurrentUser", "SessionDep", "SuperClient", "EveryPixel"]
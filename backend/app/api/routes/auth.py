@@ -1,13 +1,23 @@
+import asyncio
 import logging
 from typing import Annotated
 
-from fastapi import APIRouter, Cookie, Depends, HTTPException, Response, status
-from sqlmodel import Session, select
-from supabase._async.client import AsyncClient
-
-from app.core.auth import SuperClient, TokenDep, get_super_client
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
+from gotrue.errors import AuthError
+from sqlalchemy import bindparam, lambda_stmt
+from sqlmodel import select
+
+from app.api.deps import CurrentUser, SessionDep, SuperClient
+from app.core.auth import (
+    TokenDep,
+    TokenExpiredException,
+    forget_token,
+    get_current_user,
+    update_user_password,
+)
 from app.core.cookies import clear_auth_cookies, set_auth_cookies
-from app.core.db import get_db
+from app.core.ratelimit import RateLimiter
 from app.models import User
 from app.schemas.auth import (
     LoginRequest,
@@ -22,16 +32,27 @@ from app.schemas.response import ApiResponse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(
+    prefix="/auth", tags=["auth"], default_response_class=ORJSONResponse
+)
+
+# built once, SQLAlchemy caches the compiled SQL across requests
+_EMAIL_LOOKUP = lambda_stmt(
+    lambda: select(User.id).where(User.email == bindparam("email")).limit(1)
+)
 
 
 @router.post(
-    "/signup", response_model=ApiResponse[UserOut], status_code=status.HTTP_201_CREATED
+    "/signup",
+    response_model=ApiResponse[UserOut],
+    response_model_exclude_none=True,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(RateLimiter(limit=3, period=60))],
 )
 async def signup(
     user_data: SignupRequest,
     client: SuperClient,
-    db: Session = Depends(get_db),
+    db: SessionDep,
 ) -> ApiResponse[UserOut]:
     """
     Create a new user account via Supabase Auth.
@@ -42,20 +63,42 @@ async def signup(
     - **password**: User password (min 6 characters)
     """
     try:
-        # Check if email already exists in the database
-        existing_user = db.exec(select(User).where(User.email == user_data.email)).first()
-        if existing_user:
+        # Run the email existence check and the sign up concurrently,
+        # Supabase rejects duplicates on its own so we reconcile afterwards
+        existing_result, resp = await asyncio.gather(
+            db.execute(_EMAIL_LOOKUP, {"email": user_data.email}),
+            client.auth.sign_up(
+                {
+                    "email": user_data.email,
+                    "password": user_data.password,
+                }
+            ),
+            return_exceptions=True,
+        )
+        if isinstance(existing_result, BaseException):
+            raise existing_result
+
+        existing_user_id = existing_result.scalar()
+        created_id = (
+            resp.user.id
+            if not isinstance(resp, BaseException) and resp and resp.user
+            else None
+        )
+        # the lookup races the sign up, it may see the row sign up just wrote
+        if existing_user_id and str(existing_user_id) != created_id:
+            # best effort cleanup in case sign up created a second account
+            if created_id:
+                try:
+                    await client.auth.admin.delete_user(created_id)
+                except Exception as e:
+                    logger.warning("Orphan signup cleanup error: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Email is already registered",
             )
-        
-        resp = await client.auth.sign_up(
-            {
-                "email": user_data.email,
-                "password": user_data.password,
-            }
-        )
+
+        if isinstance(resp, BaseException):
+            raise resp
 
         if not resp or not resp.user:
             raise HTTPException(
@@ -63,7 +106,8 @@ async def signup(
                 detail="Failed to create user",
             )
 
-        user_out = UserOut(
+        # fields come straight from supabase, no need to validate them again
+        user_out = UserOut.model_construct(
             access_token=resp.session.access_token if resp.session else None,
             refresh_token=resp.session.refresh_token if resp.session else None,
             user_id=resp.user.id,
@@ -77,34 +121,44 @@ async def signup(
 
     except HTTPException:
         raise
-    except Exception as e:
-        error_msg = str(e).lower()
-        logger.error(f"Signup error: {str(e)}")
-        
+    except AuthError as e:
+        logger.error("Signup error: %s", e)
+
         # Handle common Supabase auth errors
-        if "already registered" in error_msg or "user already exists" in error_msg:
+        if e.code in ("user_already_exists", "email_exists"):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Email is already registered",
             )
-        elif "invalid email" in error_msg:
+        elif e.code == "email_address_invalid":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid email address",
             )
-        elif "password" in error_msg:
+        elif e.code == "weak_password":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Password does not meet security requirements",
             )
-        
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to create user account",
+        )
+    except Exception as e:
+        logger.error("Signup error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to create user account",
         )
 
 
-@router.post("/login", response_model=ApiResponse[UserOut])
+@router.post(
+    "/login",
+    response_model=ApiResponse[UserOut],
+    response_model_exclude_none=True,
+    dependencies=[Depends(RateLimiter(limit=5, period=60))],
+)
 async def login(
     credentials: LoginRequest,
     client: SuperClient,
@@ -132,7 +186,7 @@ async def login(
                 detail="Invalid credentials",
             )
 
-        user_out = UserOut(
+        user_out = UserOut.model_construct(
             access_token=resp.session.access_token,
             refresh_token=resp.session.refresh_token,
             user_id=resp.user.id,
@@ -148,9 +202,11 @@ async def login(
 
         return ApiResponse(data=user_out, message="Login successful")
 
-    except Exception as e:
-        logger.error(f"Login error: {str(e)}")
-        if "Invalid login credentials" in str(e):
+    except HTTPException:
+        raise
+    except AuthError as e:
+        logger.error("Login error: %s", e)
+        if e.code == "invalid_credentials":
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password",
@@ -159,12 +215,17 @@ async def login(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Login failed",
         )
+    except Exception as e:
+        logger.error("Login error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Login failed",
+        )
 
 
 @router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
 async def logout(
     token: TokenDep,
-    client: SuperClient,
     response: Response,
 ) -> None:
     """
@@ -175,15 +236,18 @@ async def logout(
     try:
         # Supabase doesn't require explicit sign_out with token for revocation
         # Just clear the cookies which effectively logs out the user
-        logger.info(f"User logout requested")
+        logger.info("User logout requested")
     except Exception as e:
-        logger.error(f"Logout error: {str(e)}")
+        logger.error("Logout error: %s", e)
     finally:
+        forget_token(token)
         # Always clear auth cookies
         clear_auth_cookies(response)
 
 
-@router.post("/refresh", response_model=ApiResponse[Token])
+@router.post(
+    "/refresh", response_model=ApiResponse[Token], response_model_exclude_none=True
+)
 async def refresh_token(
     client: SuperClient,
     response: Response,
@@ -226,8 +290,14 @@ async def refresh_token(
 
     except HTTPException:
         raise
+    except AuthError as e:
+        logger.error("Refresh token error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+        )
     except Exception as e:
-        logger.error(f"Refresh token error: {str(e)}")
+        logger.error("Refresh token error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Failed to refresh token",
@@ -235,7 +305,10 @@ async def refresh_token(
 
 
 @router.post(
-    "/password-reset", status_code=status.HTTP_202_ACCEPTED, response_model=ApiResponse
+    "/password-reset",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=ApiResponse,
+    dependencies=[Depends(RateLimiter(limit=3, period=300))],
 )
 async def request_password_reset(
     reset_data: PasswordResetRequest,
@@ -256,7 +329,7 @@ async def request_password_reset(
         )
 
     except Exception as e:
-        logger.error(f"Password reset request error: {str(e)}")
+        logger.error("Password reset request error: %s", e)
         # Don't reveal if email exists or not for security
         return ApiResponse(
             message="If an account exists, a password reset email will be sent."
@@ -269,6 +342,7 @@ async def request_password_reset(
 async def update_password(
     update_data: UpdatePasswordRequest,
     client: SuperClient,
+    request: Request,
 ) -> ApiResponse:
     """
     Update user password with a valid access token.
@@ -277,62 +351,66 @@ async def update_password(
     - **new_password**: New password (min 6 characters)
     """
     try:
-        user = await client.auth.get_user(jwt=update_data.access_token)
-        if not user or not user.user:
+        try:
+            # rejects expired and forged tokens before asking supabase
+            await get_current_user(update_data.access_token, request)
+        except TokenExpiredException:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token",
             )
 
-        await client.auth.update_user(
-            {"password": update_data.new_password},
-            jwt=update_data.access_token,
+        await update_user_password(
+            client, update_data.access_token, update_data.new_password
         )
 
         return ApiResponse(message="Password updated successfully")
 
     except HTTPException:
         raise
+    except AuthError as e:
+        logger.error("Update password error: %s", e)
+        if e.code in ("bad_jwt", "session_not_found", "user_not_found"):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token",
+            )
+        elif e.code == "reauthentication_needed":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Reauthentication required",
+            )
+        elif e.code in ("weak_password", "same_password"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Password does not meet security requirements",
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to update password",
+        )
     except Exception as e:
-        logger.error(f"Update password error: {str(e)}")
+        logger.error("Update password error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to update password",
         )
 
 
-@router.get("/me", response_model=ApiResponse[UserOut])
-async def get_current_user_info(
-    token: TokenDep,
-    client: SuperClient,
-) -> ApiResponse[UserOut]:
+@router.get(
+    "/me", response_model=ApiResponse[UserOut], response_model_exclude_none=True
+)
+async def get_current_user_info(user: CurrentUser) -> ApiResponse[UserOut]:
     """
     Get the current user information from their access token.
 
-    Requires a valid JWT token in the Authorization header.
+    Requires a valid JWT token in the access_token cookie.
     """
-    try:
-        response = await client.auth.get_user(jwt=token)
-
-        if not response or not response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token",
-            )
-
-        user_out = UserOut(
-            access_token=token,
-            user_id=response.user.id,
-            email=response.user.email,
-        )
-
-        return ApiResponse(data=user_out, message="User info retrieved successfully")
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Get user info error: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Failed to get user info",
-        )
+    # verified locally and cached, supabase is only asked as a fallback
+    user_out = UserOut.model_construct(
+        access_token=user.access_token,
+        user_id=user.id,
+        email=user.email,
+    )
+
+    return ApiResponse(data=user_out, message="User info retrieved successfully")
@@ -1,25 +1,53 @@
+import base64
+import contextlib
+import hashlib
 import logging
+import os
+import tempfile
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
+from urllib.parse import quote
 from uuid import UUID, uuid4
 
 import numpy as np
+import orjson
 from fastapi import (
     APIRouter,
     BackgroundTasks,
     File,
+    Header,
     HTTPException,
     Query,
+    Response,
     UploadFile,
     status,
 )
-from sqlmodel import select
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, RedirectResponse
+from pydantic import BaseModel
+from sqlalchemy import (
+    ColumnElement,
+    Float,
+    Text,
+    cast,
+    false,
+    or_,
+    true,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.orm import defer
+from sqlmodel import col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.api.deps import CurrentUser, SessionDep, SuperClient
 from app.core.config import settings
 from app.models.image import Image
 from app.models.image_colors import ImageColor
-from app.models.image_metadata import ImageMetadata
+from app.models.image_metadata import COLOR_DIM, ImageMetadata
 from app.models.image_tags import ImageTag
 from app.schemas.image import (
     ImageMetadataResponse,
@@ -28,43 +56,236 @@ from app.schemas.image import (
     ImageUploadResponse,
 )
 from app.schemas.response import ApiResponse
-from app.services.background_tasks import process_image_async
+from app.services.background_tasks import store_uploads_async
 from app.utils.vectors import color_query_one_hot, color_vector, tag_vector
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/images", tags=["images"])
+router = APIRouter(
+    prefix="/images", tags=["images"], default_response_class=ORJSONResponse
+)
 
 # Supabase Storage bucket name
 BUCKET_NAME = "images"
+PUBLIC_URL_PREFIX = f"{settings.SUPABASE_URL}/storage/v1/object/public/{BUCKET_NAME}/"
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+# uploads up to this size are kept in memory until stored, larger ones wait
+# for the background upload in a temporary file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024  # 8MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+COLOR_MATCH_THRESHOLD = 0.3
+# public image info only changes until AI processing has finished
+PUBLIC_URL_CACHE_CONTROL = "public, max-age=3600, stale-while-revalidate=86400"
+FINAL_PROCESSING_STATUSES = {"completed", "failed"}
+
+
+def json_response(
+    content: BaseModel,
+    status_code: int = status.HTTP_200_OK,
+    exclude_none: bool = False,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    Serialize a response model with orjson. Returning the model itself makes
+    FastAPI dump it and validate the result against response_model again.
+
+    Vector columns stay float32 arrays in the (unvalidated) models and are
+    written by orjson straight from the buffer, without boxing every element
+    into a Python float first.
+    """
+    return Response(
+        orjson.dumps(
+            content.model_dump(exclude_none=exclude_none, warnings=False),
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        ),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
+async def read_upload(file: UploadFile) -> bytes | str | None:
+    """
+    Read an upload for the background storage task, in chunks so the size
+    limit is enforced before more is buffered.
+
+    Returns: the content as bytes, or the path of a temporary file holding it
+    when larger than SPOOL_MAX_SIZE, None when larger than MAX_FILE_SIZE
+    """
+    if file.size is not None and file.size <= SPOOL_MAX_SIZE:
+        return await file.read()
+
+    total = 0
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    try:
+        with tmp:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                if total > MAX_FILE_SIZE:
+                    break
+                await run_in_threadpool(tmp.write, chunk)
+    except BaseException:
+        # e.g. client disconnect or disk full, nothing else would remove it
+        os.unlink(tmp.name)
+        raise
+
+    if total > MAX_FILE_SIZE:
+        os.unlink(tmp.name)
+        return None
+    return tmp.name
+
+
+def discard_upload(content: bytes | str) -> None:
+    """Remove the temporary file of an upload read by read_upload, if any."""
+    if isinstance(content, str):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(content)
+
+
+def encode_cursor(image: Image) -> str:
+    """Opaque keyset cursor pointing after the given image."""
+    raw = f"{image.uploaded_at.isoformat()}|{image.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """(uploaded_at, id) of a cursor made by encode_cursor."""
+    try:
+        uploaded_at, image_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(uploaded_at), UUID(image_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def color_query_matrix(color_list: list[str]) -> np.ndarray:
+    """Stack the one-hot vectors of the valid query colors into a (K, D) matrix."""
+    query_vecs = []
+    for color_query_str in color_list:
+        try:
+            query_vecs.append(color_query_one_hot(color_query_str))
+        except ValueError:
+            logger.warning(f"Invalid color: {color_query_str}")
+    return np.array(query_vecs, dtype=np.float32).reshape(-1, COLOR_DIM)
 
 
-def get_image_tags_and_colors(
-    session: any, image_id: UUID
+def color_match_clause(color_list: list[str]) -> ColumnElement[bool]:
+    """
+    SQL condition matching metadata whose color vector is close to any of
+    the query colors, invalid colors are skipped.
+    """
+    conditions = []
+    for query_vec in color_query_matrix(color_list):
+        # <#> is the negative inner product, so this is dot >= threshold
+        conditions.append(
+            col(ImageMetadata.color_vec).op("<#>", return_type=Float)(query_vec)
+            <= -COLOR_MATCH_THRESHOLD
+        )
+    return or_(false(), *conditions)
+
+
+async def get_image_tags_and_colors(
+    session: AsyncSession, image_id: UUID
 ) -> tuple[list[str], list[str]]:
     """
     Fetch tags and colors for an image from relationship tables.
 
     Returns: (tags, colors) tuples
     """
-    # Fetch tags
-    tags_statement = select(ImageTag).where(ImageTag.image_id == str(image_id))
-    image_tags = session.exec(tags_statement).all()
-    tags = [tag.tag_name for tag in image_tags]
+    tags_by_id, colors_by_id = await get_images_tags_and_colors(session, [image_id])
+    return tags_by_id[image_id], colors_by_id[image_id]
+
+
+async def get_images_tags_and_colors(
+    session: AsyncSession, image_ids: Sequence[UUID]
+) -> tuple[dict[UUID, list[str]], dict[UUID, list[str]]]:
+    """
+    Fetch tags and colors for many images in one round trip.
 
-    # Fetch colors
-    colors_statement = select(ImageColor).where(ImageColor.image_id == str(image_id))
-    image_colors = session.exec(colors_statement).all()
-    colors = [color.color_hex for color in image_colors]
+    Returns: (tags, colors) dicts keyed by image_id
+    """
+    tags_by_id: dict[UUID, list[str]] = defaultdict(list)
+    colors_by_id: dict[UUID, list[str]] = defaultdict(list)
+    if not image_ids:
+        return tags_by_id, colors_by_id
+
+    # both relationship tables in one UNION ALL, is_tag tells the rows apart
+    statement = union_all(
+        select(true().label("is_tag"), ImageTag.image_id, ImageTag.tag_name).where(
+            col(ImageTag.image_id).in_(image_ids)
+        ),
+        select(false(), ImageColor.image_id, ImageColor.color_hex).where(
+            col(ImageColor.image_id).in_(image_ids)
+        ),
+    )
+    for is_tag, image_id, value in (await session.execute(statement)).all():
+        (tags_by_id if is_tag else colors_by_id)[image_id].append(value)
+
+    return tags_by_id, colors_by_id
+
+
+async def build_image_responses(
+    session: AsyncSession, images: Sequence[Image], include_vectors: bool = False
+) -> list[ImageMetadataResponse]:
+    """
+    Build responses for a page of images without per-image queries.
 
-    return tags, colors
+    Vector columns are only read from the database when include_vectors is set.
+    """
+    image_ids = [img.id for img in images]
+    meta_by_id: dict[UUID, ImageMetadata] = {}
+    if image_ids:
+        meta_statement = select(ImageMetadata).where(
+            col(ImageMetadata.image_id).in_(image_ids)
+        )
+        if not include_vectors:
+            meta_statement = meta_statement.options(
+                defer(ImageMetadata.tag_vec),  # type: ignore[arg-type]
+                defer(ImageMetadata.color_vec),  # type: ignore[arg-type]
+            )
+        for meta in (await session.exec(meta_statement)).all():
+            meta_by_id[meta.image_id] = meta
+    tags_by_id, colors_by_id = await get_images_tags_and_colors(session, image_ids)
+
+    items = []
+    for img in images:
+        db_metadata = meta_by_id.get(img.id)
+        tags = tags_by_id.get(img.id)
+        colors_list = colors_by_id.get(img.id)
+        # rows come straight from the database, so skip validation here
+        items.append(
+            ImageMetadataResponse.model_construct(
+                id=img.id,
+                filename=img.filename,
+                original_path=img.original_path,
+                thumbnail_path=img.thumbnail_path,
+                user_id=img.user_id,
+                uploaded_at=img.uploaded_at,
+                description=db_metadata.description if db_metadata else None,
+                tags=tags if tags else None,
+                colors=colors_list if colors_list else None,
+                tag_vec=(
+                    db_metadata.tag_vec if db_metadata and include_vectors else None
+                ),
+                color_vec=(
+                    db_metadata.color_vec if db_metadata and include_vectors else None
+                ),
+                ai_processing_status=(
+                    db_metadata.ai_processing_status if db_metadata else "pending"
+                ),
+            )
+        )
+    return items
 
 
 @router.post(
     "/upload",
     response_model=ApiResponse[list[ImageUploadResponse] | ImageUploadResponse],
-    status_code=status.HTTP_201_CREATED,
+    status_code=status.HTTP_202_ACCEPTED,
 )
 async def upload_image(
     user: CurrentUser,
@@ -72,14 +293,15 @@ async def upload_image(
     client: SuperClient,
     background_tasks: BackgroundTasks,
     files: list[UploadFile] = File(...),
-) -> ApiResponse[list[ImageUploadResponse] | ImageUploadResponse]:
+) -> Response:
     """
     Upload one or more images to Supabase Storage.
 
     - **files**: Image file(s) (JPG, PNG, GIF, WebP)
     - Can upload single file or multiple files
-    - Returns: Wrapped response with uploaded image metadata
-    - AI processing happens in background (don't block upload)
+    - Returns: Wrapped response with accepted image metadata
+    - Storage upload and AI processing happen in background (don't block
+      upload), poll the image until ai_processing_status leaves "uploading"
     """
     try:
         # Ensure files is always a list
@@ -88,6 +310,8 @@ async def upload_image(
 
         allowed_types = {"image/jpeg", "image/png", "image/gif", "image/webp"}
         responses = []
+        pending_metadata = []
+        uploads = []
 
         for file in files:
             try:
@@ -98,16 +322,21 @@ async def upload_image(
                     )
                     continue
 
-                # Validate file size
-                content = await file.read()
-                if len(content) > MAX_FILE_SIZE:
+                # Validate file size, the spooled upload already knows its size
+                # so oversized files are rejected without being read at all
+                if file.size is not None and file.size > MAX_FILE_SIZE:
                     logger.warning(
-                        f"File too large: {file.filename} ({len(content) / 1024 / 1024:.1f}MB)"
+                        f"File too large: {file.filename} ({file.size / 1024 / 1024:.1f}MB)"
                     )
                     continue
 
+                content = await read_upload(file)
+                if content is None:
+                    logger.warning(f"File too large: {file.filename}")
+                    continue
+
                 # Create unique file path
-                file_id = str(UUID(user.id))
+                file_id = str(user.uuid)
 
                 # Generate unique filename to avoid conflicts
                 # Format: {original_name_without_ext}_{uuid4}.{ext}
@@ -117,75 +346,33 @@ async def upload_image(
                 )
                 file_path = f"{file_id}/{unique_filename}"
 
-                # Upload to Supabase Storage
-                try:
-                    response = await client.storage.from_(BUCKET_NAME).upload(
-                        path=file_path,
-                        file=content,
-                        file_options={"content-type": file.content_type},
-                    )
-                    logger.info(f"File uploaded: {file_path}")
-                except Exception as e:
-                    logger.error(f"Storage upload error for {file.filename}: {str(e)}")
-                    continue
-
-                # Create database record
+                # Create database records, ids are generated client side so
+                # every file is written in the single transaction after the
+                # loop. The storage upload happens after the response so the
+                # client polls the status instead
                 db_image = Image(
                     filename=file.filename,
                     original_path=file_path,
                     thumbnail_path=None,
-                    user_id=UUID(user.id),
+                    user_id=user.uuid,
                 )
-
-                session.add(db_image)
-                session.commit()
-                session.refresh(db_image)
-
-                logger.info(f"Image record created: {db_image.id}")
-
-                # Create initial metadata record with "pending" status
                 db_metadata = ImageMetadata(
                     image_id=db_image.id,
-                    user_id=UUID(user.id),
-                    ai_processing_status="pending",
+                    user_id=user.uuid,
+                    ai_processing_status="uploading",
                 )
-
-                session.add(db_metadata)
-                session.commit()
-                session.refresh(db_metadata)
-
-                logger.info(
-                    f"Image metadata created: {db_metadata.id} with status=pending"
-                )
-
-                # Schedule async image processing in background
-                try:
-                    res = await client.storage.from_("images").create_signed_url(
-                        file_path, 600
-                    )
-                    signed_url = res["signedURL"]
-
-                    background_tasks.add_task(
-                        process_image_async,
-                        image_id=db_image.id,
-                        file_path=file_path,
-                        user_id=UUID(user.id),
-                        signed_url=signed_url,
-                    )
-                    logger.info(f"Scheduled async processing for image {db_image.id}")
-
-                except Exception as e:
-                    logger.warning(f"Could not schedule AI processing: {str(e)}")
-                    # Continue anyway - image is uploaded, just won't have AI metadata
+                session.add(db_image)
+                pending_metadata.append(db_metadata)
+                uploads.append((db_image, file_path, content, file.content_type))
 
                 responses.append(
-                    ImageUploadResponse(
+                    ImageUploadResponse.model_construct(
                         id=db_image.id,
                         filename=db_image.filename,
                         original_path=db_image.original_path,
                         user_id=db_image.user_id,
                         uploaded_at=db_image.uploaded_at,
-                        ai_processing_status="pending",
+                        ai_processing_status="uploading",
                     )
                 )
 
@@ -193,11 +380,45 @@ async def upload_image(
                 logger.error(f"Error uploading {file.filename}: {str(e)}")
                 continue
 
+        # nothing to write when every file was rejected
+        if uploads:
+            # metadata references images without a relationship, so the
+            # images are flushed first to keep the inserts in foreign key order
+            try:
+                await session.flush()
+                session.add_all(pending_metadata)
+                await session.commit()
+            except Exception:
+                for _, _, content, _ in uploads:
+                    discard_upload(content)
+                raise
+            logger.info(
+                f"Created {len(uploads)} image records with status=uploading"
+            )
+
+            # Storage uploads and their signed URLs are batched into one task
+            # scheduled only once the records exist
+            background_tasks.add_task(
+                store_uploads_async,
+                bucket=client.storage.from_(BUCKET_NAME),
+                uploads=[
+                    (db_image.id, file_path, content, content_type)
+                    for db_image, file_path, content, content_type in uploads
+                ],
+                user_id=user.uuid,
+            )
+
         # Return single response or list based on input
         if len(responses) == 1:
-            return ApiResponse(data=responses[0], message="Image uploaded successfully")
-        return ApiResponse(
-            data=responses, message=f"{len(responses)} images uploaded successfully"
+            return json_response(
+                ApiResponse(data=responses[0], message="Image accepted for upload"),
+                status_code=status.HTTP_202_ACCEPTED,
+            )
+        return json_response(
+            ApiResponse(
+                data=responses, message=f"{len(responses)} images accepted for upload"
+            ),
+            status_code=status.HTTP_202_ACCEPTED,
         )
 
     except Exception as e:
@@ -212,32 +433,34 @@ async def upload_image(
 async def get_image(
     image_id: str,
     session: SessionDep,
-) -> ApiResponse[ImageMetadataResponse]:
+) -> Response:
     """
     Get image details by ID with AI metadata.
 
     - **image_id**: Image UUID
     """
     try:
-        statement = select(Image).where(Image.id == UUID(image_id))
-        db_image = session.exec(statement).first()
+        img_uuid = UUID(image_id)
 
-        if not db_image:
+        # Get the image together with its metadata
+        statement = (
+            select(Image, ImageMetadata)
+            .outerjoin(ImageMetadata, ImageMetadata.image_id == Image.id)
+            .where(Image.id == img_uuid)
+        )
+        row = (await session.exec(statement)).first()
+
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Image not found",
             )
-
-        # Get metadata
-        meta_statement = select(ImageMetadata).where(
-            ImageMetadata.image_id == UUID(image_id)
-        )
-        db_metadata = session.exec(meta_statement).first()
+        db_image, db_metadata = row
 
         # Get tags and colors
-        tags, colors = get_image_tags_and_colors(session, UUID(image_id))
+        tags, colors = await get_image_tags_and_colors(session, img_uuid)
 
-        response_data = ImageMetadataResponse(
+        response_data = ImageMetadataResponse.model_construct(
             id=db_image.id,
             filename=db_image.filename,
             original_path=db_image.original_path,
@@ -254,7 +477,9 @@ async def get_image(
             ),
         )
 
-        return ApiResponse(data=response_data, message="Image retrieved successfully")
+        return json_response(
+            ApiResponse(data=response_data, message="Image retrieved successfully")
+        )
 
     except HTTPException:
         raise
@@ -280,259 +505,105 @@ async def get_images(
         None,
         description="Filter by color(s) - comma separated (e.g., red,blue or #FF0000,#0000FF)",
     ),
-) -> ImagesListResponse:
+    include_vectors: bool = Query(
+        False, description="Include tag_vec and color_vec in the response"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor of the previous page, replaces skip"
+    ),
+) -> Response:
     """
     Get images for current user with optional filtering.
 
-    - **skip**: Number of images to skip
+    - **skip**: Number of images to skip (deprecated, use cursor)
     - **limit**: Maximum number of images to return
+    - **cursor**: Continue after the page that returned this next_cursor
     - **tag**: Optional tag filter(s) - comma separated (e.g., person,women)
     - **desc**: Optional description search text
     - **color**: Optional color filter(s) - comma separated (e.g., red,blue or #FF0000,#0000FF)
+    - **include_vectors**: Return tag_vec and color_vec (default: false)
 
     If no query params: Returns images sorted by upload date (newest first)
     """
     try:
-        user_uuid = UUID(user.id)
+        user_uuid = user.uuid
 
         # Parse comma-separated values
         tag_list = [t.strip() for t in tag.split(",")] if tag else None
         color_list = [c.strip() for c in color.split(",")] if color else None
 
-        # Handle tag and/or description filtering
-        tag_matched_ids = None
-        desc_matched_ids = None
-        color_matched_ids = None
+        # Every active filter becomes a subquery on image ids, so filtering,
+        # counting and pagination all run in SQL with AND logic between them
+        conditions: list[ColumnElement[bool]] = [col(Image.user_id) == user_uuid]
 
-        # Search by tag name(s)
+        # Search by tag name(s), combining all tags with OR logic
         if tag_list:
-            tag_image_ids_list = []
-            for tag_name in tag_list:
-                tag_results = session.exec(
-                    select(ImageTag.image_id).where(
-                        ImageTag.tag_name.ilike(f"%{tag_name}%")
-                    )
+            tag_ids = select(ImageTag.image_id).where(
+                or_(
+                    *[
+                        # text cast so the trigram index on tag_name applies
+                        cast(ImageTag.tag_name, Text).ilike(f"%{tag_name}%")
+                        for tag_name in tag_list
+                    ]
                 )
-                tag_image_ids_list.append({row for row in tag_results.all()})
-
-            # Combine all tag results with OR logic
-            tag_matched_ids = (
-                set().union(*tag_image_ids_list) if tag_image_ids_list else set()
             )
+            conditions.append(col(Image.id).in_(tag_ids))
 
         # Search by description
         if desc:
-            description_query = (
-                select(Image)
-                .join(ImageMetadata)
-                .where(
-                    Image.user_id == user_uuid,
-                    ImageMetadata.description.ilike(f"%{desc}%"),
-                )
+            desc_ids = select(ImageMetadata.image_id).where(
+                ImageMetadata.user_id == user_uuid,
+                col(ImageMetadata.description).ilike(f"%{desc}%"),
             )
-            desc_results = session.exec(description_query)
-            desc_matched_ids = {img.id for img in desc_results.all()}
+            conditions.append(col(Image.id).in_(desc_ids))
 
-        # Handle color filter
+        # Handle color filter, matching any of the colors
         if color_list:
-            # Get all user's images with metadata and colors
-            all_images_query = (
-                select(Image, ImageMetadata, ImageColor)
-                .join(ImageMetadata, Image.id == ImageMetadata.image_id)
-                .outerjoin(ImageColor, Image.id == ImageColor.image_id)
-                .where(Image.user_id == user_uuid)
+            color_ids = select(ImageMetadata.image_id).where(
+                ImageMetadata.user_id == user_uuid,
+                color_match_clause(color_list),
             )
-            result = session.exec(all_images_query)
-            rows = result.all()
-
-            # Find images matching any of the colors (without scoring)
-            color_matched_ids = set()
-
-            for color_query_str in color_list:
-                try:
-                    query_vec = color_query_one_hot(color_query_str)
-                    query_vec_np = np.array(query_vec, dtype=np.float32)
-
-                    for row in rows:
-                        img, metadata, color = row[0], row[1], row[2]
-                        if metadata.color_vec is not None:
-                            stored_vec = np.array(metadata.color_vec, dtype=np.float32)
-                            # Use a threshold to determine if colors match
-                            similarity = float(np.dot(query_vec_np, stored_vec))
-                            if similarity >= 0.3:  # Color match threshold
-                                color_matched_ids.add(img.id)
-                except ValueError:
-                    logger.warning(f"Invalid color: {color_query_str}")
-                    continue
-
-            if not color_matched_ids:
-                return ImagesListResponse(
-                    data=[],
-                    count=0,
-                    total=0,
-                    page=skip // limit + 1 if limit > 0 else 1,
-                    page_size=limit,
-                )
-
-        # Combine all filters
-        if (
-            tag_matched_ids is not None
-            or desc_matched_ids is not None
-            or color_matched_ids is not None
-        ):
-            # Determine which IDs to include based on what filters are active
-            if (
-                tag_matched_ids is not None
-                and desc_matched_ids is not None
-                and color_matched_ids is not None
-            ):
-                # All three: AND logic
-                matched_ids = tag_matched_ids & desc_matched_ids & color_matched_ids
-            elif tag_matched_ids is not None and desc_matched_ids is not None:
-                # Tag and description: AND logic
-                matched_ids = tag_matched_ids & desc_matched_ids
-            elif tag_matched_ids is not None and color_matched_ids is not None:
-                # Tag and color: AND logic
-                matched_ids = tag_matched_ids & color_matched_ids
-            elif desc_matched_ids is not None and color_matched_ids is not None:
-                # Description and color: AND logic
-                matched_ids = desc_matched_ids & color_matched_ids
-            elif tag_matched_ids is not None:
-                # Only tag filter
-                matched_ids = tag_matched_ids
-            elif desc_matched_ids is not None:
-                # Only description filter
-                matched_ids = desc_matched_ids
-            else:
-                # Only color filter
-                matched_ids = color_matched_ids
-
-            if not matched_ids:
-                return ImagesListResponse(
-                    data=[],
-                    count=0,
-                    total=0,
-                    page=skip // limit + 1 if limit > 0 else 1,
-                    page_size=limit,
-                )
-
-            # Get total count
-            count_query = select(Image).where(
-                Image.user_id == user_uuid,
-                Image.id.in_(list(matched_ids)),
-            )
-            count_result = session.exec(count_query)
-            total = len(count_result.all())
-
-            # Get paginated results
-            statement = (
-                select(Image)
-                .where(
-                    Image.user_id == user_uuid,
-                    Image.id.in_(list(matched_ids)),
-                )
-                .order_by(Image.uploaded_at.desc())
-                .offset(skip)
-                .limit(limit)
-            )
-            db_images = session.exec(statement).all()
-
-            # Build response
-            items = []
-            for img in db_images:
-                # Get metadata
-                meta_query = select(ImageMetadata).where(ImageMetadata.image_id == img.id)
-                db_metadata = session.exec(meta_query).first()
-
-                # Get tags and colors
-                tags, colors_list = get_image_tags_and_colors(session, img.id)
-
-                items.append(
-                    ImageMetadataResponse(
-                        id=img.id,
-                        filename=img.filename,
-                        original_path=img.original_path,
-                        thumbnail_path=img.thumbnail_path,
-                        user_id=img.user_id,
-                        uploaded_at=img.uploaded_at,
-                        description=db_metadata.description if db_metadata else None,
-                        tags=tags if tags else None,
-                        colors=colors_list if colors_list else None,
-                        tag_vec=db_metadata.tag_vec if db_metadata else None,
-                        color_vec=db_metadata.color_vec if db_metadata else None,
-                        ai_processing_status=(
-                            db_metadata.ai_processing_status
-                            if db_metadata
-                            else "pending"
-                        ),
-                    )
-                )
-
-            page = skip // limit + 1 if limit > 0 else 1
-            return ImagesListResponse(
-                data=items,
-                count=len(items),
-                total=total,
-                page=page,
-                page_size=limit,
+            conditions.append(col(Image.id).in_(color_ids))
+
+        # Get total count
+        count_statement = select(func.count()).select_from(Image).where(*conditions)
+        total = (await session.exec(count_statement)).one()
+
+        # Get paginated results sorted by upload date (newest first). A cursor
+        # seeks past the previous page in the index instead of skipping rows,
+        # an offset page past the end is known to be empty from the count
+        statement = (
+            select(Image)
+            .where(*conditions)
+            .order_by(col(Image.uploaded_at).desc(), col(Image.id).desc())
+            .limit(limit)
+        )
+        if cursor:
+            statement = statement.where(
+                tuple_(col(Image.uploaded_at), col(Image.id)) < decode_cursor(cursor)
             )
-
-        # Default: list all images sorted by upload date
+            db_images = (await session.exec(statement)).all() if total else []
         else:
-            # Get total count
-            count_statement = select(Image).where(Image.user_id == user_uuid)
-            all_images = session.exec(count_statement).all()
-            total = len(all_images)
-
-            # Get paginated results sorted by upload date (newest first)
-            statement = (
-                select(Image)
-                .where(Image.user_id == user_uuid)
-                .order_by(Image.uploaded_at.desc())
-                .offset(skip)
-                .limit(limit)
-            )
-            db_images = session.exec(statement).all()
-
-            # Build response
-            items = []
-            for img in db_images:
-                # Get metadata
-                meta_query = select(ImageMetadata).where(ImageMetadata.image_id == img.id)
-                db_metadata = session.exec(meta_query).first()
-
-                # Get tags and colors
-                tags, colors_list = get_image_tags_and_colors(session, img.id)
-
-                items.append(
-                    ImageMetadataResponse(
-                        id=img.id,
-                        filename=img.filename,
-                        original_path=img.original_path,
-                        thumbnail_path=img.thumbnail_path,
-                        user_id=img.user_id,
-                        uploaded_at=img.uploaded_at,
-                        description=db_metadata.description if db_metadata else None,
-                        tags=tags if tags else None,
-                        colors=colors_list if colors_list else None,
-                        tag_vec=db_metadata.tag_vec if db_metadata else None,
-                        color_vec=db_metadata.color_vec if db_metadata else None,
-                        ai_processing_status=(
-                            db_metadata.ai_processing_status
-                            if db_metadata
-                            else "pending"
-                        ),
-                    )
-                )
+            statement = statement.offset(skip)
+            db_images = (await session.exec(statement)).all() if total > skip else []
 
-            page = skip // limit + 1 if limit > 0 else 1
-            return ImagesListResponse(
+        # Build response
+        items = await build_image_responses(session, db_images, include_vectors)
+
+        page = skip // limit + 1 if limit > 0 else 1
+        return json_response(
+            ImagesListResponse.model_construct(
                 data=items,
                 count=len(items),
                 total=total,
                 page=page,
                 page_size=limit,
-            )
+                next_cursor=(
+                    encode_cursor(db_images[-1]) if len(db_images) == limit else None
+                ),
+            ),
+            exclude_none=True,
+        )
 
     except HTTPException:
         raise
@@ -561,7 +632,10 @@ async def get_similar_images(
     threshold: float = Query(
         0.5, ge=0.0, le=1.0, description="Similarity threshold (0.0-1.0) for matching"
     ),
-) -> ImagesListResponse:
+    include_vectors: bool = Query(
+        False, description="Include tag_vec and color_vec in the response"
+    ),
+) -> Response:
     """
     Get similar images based on tag vectors and optional filters.
 
@@ -571,125 +645,131 @@ async def get_similar_images(
     - **desc**: Optional description search text
     - **color**: Optional color filter(s) - comma separated (e.g., red,blue or #FF0000,#0000FF)
     - **threshold**: Similarity threshold (0.0-1.0) for tag matching (default: 0.5)
+    - **include_vectors**: Return tag_vec and color_vec (default: false)
 
     Returns images sorted by tag similarity (highest first), optionally filtered by other criteria.
     """
     try:
-        user_uuid = UUID(user.id)
+        user_uuid = user.uuid
 
         # Parse comma-separated values
         tag_list = [t.strip() for t in tag.split(",")] if tag else None
         color_list = [c.strip() for c in color.split(",")] if color else None
 
-        # Get all user's images with metadata and colors
+        # Get all user's images that have tag vectors, one row per image.
+        # Colors are only needed for the returned page and are fetched for it
+        # below. The 4096-d tag vector is reduced to its norm in the database
+        # and only transferred when the response includes it
         all_images_query = (
-            select(Image, ImageMetadata, ImageColor)
+            select(Image, ImageMetadata, func.l2_norm(ImageMetadata.tag_vec))
             .join(ImageMetadata, Image.id == ImageMetadata.image_id)
-            .outerjoin(ImageColor, Image.id == ImageColor.image_id)
-            .where(Image.user_id == user_uuid)
+            .where(
+                Image.user_id == user_uuid, col(ImageMetadata.tag_vec).is_not(None)
+            )
         )
-        result = session.exec(all_images_query)
+        if not include_vectors:
+            all_images_query = all_images_query.options(
+                defer(ImageMetadata.tag_vec)  # type: ignore[arg-type]
+            )
+            # color vectors are still needed to apply a color filter
+            if not color_list:
+                all_images_query = all_images_query.options(
+                    defer(ImageMetadata.color_vec)  # type: ignore[arg-type]
+                )
+        result = await session.exec(all_images_query)
         rows = result.all()
 
         if not rows:
-            return ImagesListResponse(
-                data=[],
-                count=0,
-                total=0,
-                page=skip // limit + 1 if limit > 0 else 1,
-                page_size=limit,
+            return json_response(
+                ImagesListResponse.model_construct(
+                    data=[],
+                    count=0,
+                    total=0,
+                    page=skip // limit + 1 if limit > 0 else 1,
+                    page_size=limit,
+                ),
+                exclude_none=True,
             )
 
-        # Calculate similarity scores for all images based on tag vectors
-        image_scores = []
-
-        for row in rows:
-            img, metadata, color = row[0], row[1], row[2]
-
-            # Skip images without tag vectors
-            if metadata.tag_vec is None:
-                continue
-
-            stored_vec = np.array(metadata.tag_vec, dtype=np.float32)
-
-            # If tag filters provided, check if image matches them first
-            tag_match = True
-            if tag_list:
-                img_tags, _ = get_image_tags_and_colors(session, img.id)
-                matches = [
-                    tag.lower() in [t.lower() for t in img_tags] for tag in tag_list
-                ]
-                tag_match = any(matches)  # OR logic: match any tag
+        # Match every stored color vector against all query colors at once
+        color_matched_ids: set[UUID] = set()
+        if color_list:
+            # query colors are one-hot, so a dot product with one of them is
+            # just the stored value in its hue bin
+            query_bins = np.flatnonzero(color_query_matrix(color_list).any(axis=0))
+            colored = [row for row in rows if row[1].color_vec is not None]
+            if colored and len(query_bins):
+                # vectors arrive as float32 arrays, already normalized on insert
+                stored = np.array(
+                    [row[1].color_vec for row in colored], dtype=np.float32
+                )
+                mask = (stored[:, query_bins] >= COLOR_MATCH_THRESHOLD).any(axis=1)
+                color_matched_ids = {colored[i][0].id for i in np.flatnonzero(mask)}
 
-            if not tag_match:
-                continue
+        # Evaluate filters from cheapest to most expensive, in memory first
+        desc_lower = desc.lower() if desc else None
+        candidates = []
 
+        for img, metadata, tag_norm in rows:
             # If description filter provided, check it
-            desc_match = True
-            if desc:
-                if (
-                    metadata.description is None
-                    or desc.lower() not in metadata.description.lower()
-                ):
-                    desc_match = False
-
-            if not desc_match:
+            if desc_lower and (
+                metadata.description is None
+                or desc_lower not in metadata.description.lower()
+            ):
                 continue
 
             # If color filter provided, check it
-            color_match = True
-            if color_list:
-                if metadata.color_vec is None:
-                    color_match = False
-                else:
-                    color_matched = False
-                    for color_query_str in color_list:
-                        try:
-                            query_vec = color_query_one_hot(color_query_str)
-                            query_vec_np = np.array(query_vec, dtype=np.float32)
-                            color_vec_np = np.array(
-                                metadata.color_vec, dtype=np.float32
-                            )
-                            similarity = float(np.dot(query_vec_np, color_vec_np))
-                            if similarity >= 0.3:
-                                color_matched = True
-                                break
-                        except ValueError:
-                            continue
-                    color_match = color_matched
-
-            if not color_match:
+            if color_list and img.id not in color_matched_ids:
                 continue
 
-            # Calculate average similarity across all tag vectors
-            # Since we don't have a query image, use the vector magnitude as a proxy
-            # or just use a default high score for all that pass filters
-            similarity_score = float(np.linalg.norm(stored_vec))
+            candidates.append((img, metadata, tag_norm))
 
-            image_scores.append((img, metadata, similarity_score))
+        # Tag filter last, with the tags of the remaining images fetched at once
+        if tag_list and candidates:
+            lower_tag_list = {t.lower() for t in tag_list}
+            candidate_tags, _ = await get_images_tags_and_colors(
+                session, [img.id for img, _, _ in candidates]
+            )
+            candidates = [
+                (img, metadata, tag_norm)
+                for img, metadata, tag_norm in candidates
+                # OR logic: match any tag
+                if lower_tag_list.intersection(
+                    t.lower() for t in candidate_tags.get(img.id, [])
+                )
+            ]
 
-        if not image_scores:
-            return ImagesListResponse(
-                data=[],
-                count=0,
-                total=0,
-                page=skip // limit + 1 if limit > 0 else 1,
-                page_size=limit,
+        # Similarity scores are the tag vector norms selected above, since we
+        # don't have a query image the vector magnitude is used as a proxy
+        if not candidates:
+            return json_response(
+                ImagesListResponse.model_construct(
+                    data=[],
+                    count=0,
+                    total=0,
+                    page=skip // limit + 1 if limit > 0 else 1,
+                    page_size=limit,
+                ),
+                exclude_none=True,
             )
 
         # Sort by similarity score descending
-        sorted_images = sorted(image_scores, key=lambda x: x[2], reverse=True)
+        sorted_images = sorted(candidates, key=lambda x: x[2], reverse=True)
 
         # Apply pagination
         total = len(sorted_images)
         paginated = sorted_images[skip : skip + limit]
 
         # Build response
+        page_tags, page_colors = await get_images_tags_and_colors(
+            session, [img.id for img, _, _ in paginated]
+        )
         items = []
         for img, metadata, score in paginated:
-            tags, colors_list = get_image_tags_and_colors(session, img.id)
+            tags = page_tags.get(img.id)
+            colors_list = page_colors.get(img.id)
             items.append(
-                ImageMetadataResponse(
+                ImageMetadataResponse.model_construct(
                     id=img.id,
                     filename=img.filename,
                     original_path=img.original_path,
@@ -699,18 +779,21 @@ async def get_similar_images(
                     description=metadata.description,
                     tags=tags if tags else None,
                     colors=colors_list if colors_list else None,
-                    tag_vec=metadata.tag_vec,
-                    color_vec=metadata.color_vec,
+                    tag_vec=metadata.tag_vec if include_vectors else None,
+                    color_vec=metadata.color_vec if include_vectors else None,
                     ai_processing_status=metadata.ai_processing_status,
                 )
             )
 
-        return ImagesListResponse(
-            data=items,
-            count=len(items),
-            total=total,
-            page=skip // limit + 1 if limit > 0 else 1,
-            page_size=limit,
+        return json_response(
+            ImagesListResponse.model_construct(
+                data=items,
+                count=len(items),
+                total=total,
+                page=skip // limit + 1 if limit > 0 else 1,
+                page_size=limit,
+            ),
+            exclude_none=True,
         )
 
     except HTTPException:
@@ -723,23 +806,26 @@ async def get_similar_images(
         )
 
 
-@router.get("/download/{image_id}")
+@router.get(
+    "/download/{image_id}",
+    response_class=RedirectResponse,
+    status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+)
 async def download_image(
     image_id: str,
     user: CurrentUser,
     session: SessionDep,
     client: SuperClient,
-):
+) -> RedirectResponse:
     """
     Download an image file from storage.
 
     - **image_id**: Image UUID
-    - Returns: File download
+    - Returns: Redirect to a signed storage URL serving the file
     """
     try:
         # Verify image exists and belongs to user
-        statement = select(Image).where(Image.id == UUID(image_id))
-        db_image = session.exec(statement).first()
+        db_image = await session.get(Image, UUID(image_id))
 
         if not db_image:
             raise HTTPException(
@@ -747,23 +833,24 @@ async def download_image(
                 detail="Image not found",
             )
 
-        if db_image.user_id != UUID(user.id):
+        if db_image.user_id != user.uuid:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to download this image",
             )
 
-        # Download from storage
+        # Redirect to a short lived signed URL, the file never passes
+        # through this process. Storage sends it as an attachment under the
+        # original filename instead of the unique storage name, storage3
+        # appends the name to the URL as is so it is quoted here
+        download = quote(db_image.filename) if db_image.filename else True
         try:
-            file_data = await client.storage.from_(BUCKET_NAME).download(
-                db_image.original_path
+            res = await client.storage.from_(BUCKET_NAME).create_signed_url(
+                db_image.original_path, 60, {"download": download}
+            )
+            return RedirectResponse(
+                res["signedURL"], status_code=status.HTTP_307_TEMPORARY_REDIRECT
             )
-
-            return {
-                "filename": db_image.filename,
-                "content": file_data.decode("utf-8", errors="ignore"),
-                "size": len(file_data),
-            }
 
         except Exception as e:
             logger.error(f"Storage download error: {str(e)}")
@@ -796,8 +883,7 @@ async def delete_image(
     """
     try:
         # Get image
-        statement = select(Image).where(Image.id == UUID(image_id))
-        db_image = session.exec(statement).first()
+        db_image = await session.get(Image, UUID(image_id))
 
         if not db_image:
             raise HTTPException(
@@ -806,7 +892,7 @@ async def delete_image(
             )
 
         # Verify ownership
-        if db_image.user_id != UUID(user.id):
+        if db_image.user_id != user.uuid:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to delete this image",
@@ -821,8 +907,8 @@ async def delete_image(
             # Continue with database deletion even if storage fails
 
         # Delete from database (will cascade delete metadata)
-        session.delete(db_image)
-        session.commit()
+        await session.delete(db_image)
+        await session.commit()
 
         logger.info(f"Image deleted: {image_id}")
 
@@ -840,46 +926,73 @@ async def delete_image(
 async def get_public_url(
     image_id: str,
     session: SessionDep,
-) -> ImagePublicResponse:
+    if_none_match: str | None = Header(None),
+) -> Response:
     """
     Get public URL for an image with metadata.
 
     - **image_id**: Image UUID
-    - Returns: Public URL and image metadata
+    - Returns: Public URL and image metadata, cacheable once AI processing
+      has finished, 304 when the If-None-Match ETag still matches
     """
     try:
-        statement = select(Image).where(Image.id == UUID(image_id))
-        db_image = session.exec(statement).first()
+        img_uuid = UUID(image_id)
 
-        if not db_image:
+        # Get the image together with its metadata
+        statement = (
+            select(Image, ImageMetadata)
+            .outerjoin(ImageMetadata, ImageMetadata.image_id == Image.id)
+            .where(Image.id == img_uuid)
+        )
+        row = (await session.exec(statement)).first()
+
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Image not found",
             )
+        db_image, db_metadata = row
 
-        # Get metadata
-        meta_statement = select(ImageMetadata).where(
-            ImageMetadata.image_id == UUID(image_id)
+        # The response only changes with the processing status, so answer
+        # revalidations before loading tags and colors
+        processing_status = (
+            db_metadata.ai_processing_status if db_metadata else "pending"
         )
-        db_metadata = session.exec(meta_statement).first()
+        etag_source = f"{db_image.uploaded_at}:{processing_status}".encode()
+        etag = f'"{hashlib.blake2b(etag_source, digest_size=16).hexdigest()}"'
+        cache_headers = {
+            "ETag": etag,
+            "Cache-Control": (
+                PUBLIC_URL_CACHE_CONTROL
+                if processing_status in FINAL_PROCESSING_STATUSES
+                else "no-cache"
+            ),
+        }
+        if if_none_match == etag:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers
+            )
 
         # Get tags and colors
-        tags, colors = get_image_tags_and_colors(session, UUID(image_id))
+        tags, colors = await get_image_tags_and_colors(session, img_uuid)
 
         # Construct public URL
-        public_url = f"{settings.SUPABASE_URL}/storage/v1/object/public/{BUCKET_NAME}/{db_image.original_path}"
-
-        return ImagePublicResponse(
-            id=db_image.id,
-            filename=db_image.filename,
-            user_id=db_image.user_id,
-            uploaded_at=db_image.uploaded_at,
-            url=public_url,
-            description=db_metadata.description if db_metadata else None,
-            tags=tags if tags else None,
-            colors=colors if colors else None,
-            tag_vec=db_metadata.tag_vec if db_metadata else None,
-            color_vec=db_metadata.color_vec if db_metadata else None,
+        public_url = PUBLIC_URL_PREFIX + db_image.original_path
+
+        return json_response(
+            ImagePublicResponse.model_construct(
+                id=db_image.id,
+                filename=db_image.filename,
+                user_id=db_image.user_id,
+                uploaded_at=db_image.uploaded_at,
+                url=public_url,
+                description=db_metadata.description if db_metadata else None,
+                tags=tags if tags else None,
+                colors=colors if colors else None,
+                tag_vec=db_metadata.tag_vec if db_metadata else None,
+                color_vec=db_metadata.color_vec if db_metadata else None,
+            ),
+            headers=cache_headers,
         )
 
     except HTTPException:
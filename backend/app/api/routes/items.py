@@ -1,6 +1,9 @@
+from typing import cast
 from uuid import UUID
 
 from fastapi import APIRouter
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
 
 from app.api.deps import CurrentUser, SessionDep
 from app.crud import item
@@ -8,31 +11,49 @@ from app.models.item import Item, ItemCreate, ItemUpdate
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+# NOTE: the CRUD layer is sync, run it on the async session's sync facade
+
+
+def _crud_session(session: OrmSession) -> Session:
+    # sqlmodel's AsyncSession hands run_sync its sqlmodel Session, the
+    # signature of run_sync only knows the SQLAlchemy base class
+    return cast(Session, session)
+
 
 @router.post("/create-item")
 async def create_item(
     item_in: ItemCreate, user: CurrentUser, session: SessionDep
 ) -> Item:
-    return item.create(session, owner_id=UUID(user.id), obj_in=item_in)
+    return await session.run_sync(
+        lambda s: item.create(_crud_session(s), owner_id=user.uuid, obj_in=item_in)
+    )
 
 
 @router.get("/get-item/{id}")
 async def read_item_by_id(id: str, session: SessionDep) -> Item | None:
-    return item.get(session, id=UUID(id))
+    return await session.run_sync(lambda s: item.get(_crud_session(s), id=UUID(id)))
 
 
 @router.get("/get-items")
 async def read_items(
     session: SessionDep, skip: int = 0, limit: int = 100
 ) -> list[Item]:
-    return list(item.get_multi(session, skip=skip, limit=limit))
+    return list(
+        await session.run_sync(
+            lambda s: item.get_multi(_crud_session(s), skip=skip, limit=limit)
+        )
+    )
 
 
 @router.put("/update-item/{id}")
 async def update_item(id: str, item_in: ItemUpdate, session: SessionDep) -> Item | None:
-    return item.update(session, id=UUID(id), obj_in=item_in)
+    return await session.run_sync(
+        lambda s: item.update(_crud_session(s), id=UUID(id), obj_in=item_in)
+    )
 
 
 @router.delete("/delete/{id}")
 async def delete_item(id: str, session: SessionDep) -> Item | None:
-    return item.remove(session, id=UUID(id))
+    return await session.run_sync(
+        lambda s: item.remove(_crud_session(s), id=UUID(id))
+    )
@@ -1,13 +1,25 @@
+import asyncio
+import hashlib
 import logging
-from typing import Annotated
+import time
+from typing import Annotated, Any
 
-from fastapi import Cookie, Depends, HTTPException
+import httpx
+import jwt
+from cachetools import TLRUCache
+from fastapi import Cookie, Depends, HTTPException, Request
+from storage3 import AsyncStorageClient
+from storage3.constants import DEFAULT_TIMEOUT as DEFAULT_STORAGE_CLIENT_TIMEOUT
 from supabase import AsyncClientOptions
-from supabase._async.client import AsyncClient, create_client
+from supabase._async.auth_client import AsyncSupabaseAuthClient
+from supabase._async.client import AsyncClient
+from supabase.lib.client_options import ClientOptions
 
 from app.core.config import settings
 from app.schemas.auth import UserIn
 
+logger = logging.getLogger(__name__)
+
 
 class TokenExpiredException(Exception):
     """Raised when JWT token is expired or invalid"""
@@ -17,15 +29,108 @@ class TokenExpiredException(Exception):
         super().__init__(self.message)
 
 
-async def get_super_client() -> AsyncClient:
-    """for validation access_token init at life span event"""
-    super_client = await create_client(
+# connection pool shared by the gotrue and storage sessions of the super client
+POOL_LIMITS = httpx.Limits(
+    max_connections=200,
+    max_keepalive_connections=100,
+    keepalive_expiry=30.0,
+)
+
+
+class PooledAsyncStorageClient(AsyncStorageClient):  # type: ignore[misc]  # untyped storage3 base
+    """Storage client keeping a large pool of warm HTTP/2 connections"""
+
+    def _create_session(
+        self,
+        base_url: str,
+        headers: dict[str, str],
+        timeout: int,
+        verify: bool = True,
+        proxy: str | None = None,
+    ) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=POOL_LIMITS,
+            proxy=proxy,
+            verify=bool(verify),
+            follow_redirects=True,
+            http2=True,
+        )
+
+
+class SharedAsyncClient(AsyncClient):
+    """Supabase client shared across requests, always acting as service role"""
+
+    def _listen_to_auth_events(self, event: Any, session: Any) -> None:
+        # signing users in/out through the shared client must not swap the
+        # service role Authorization header used by storage and postgrest
+        return None
+
+    @staticmethod
+    def _init_supabase_auth_client(
+        auth_url: str,
+        client_options: ClientOptions,
+        verify: bool = True,
+        proxy: str | None = None,
+    ) -> AsyncSupabaseAuthClient:
+        # every /auth route proxies to gotrue, keep a large pool of warm
+        # HTTP/2 connections instead of the httpx defaults
+        http_client = httpx.AsyncClient(
+            http2=True,
+            limits=POOL_LIMITS,
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            verify=verify,
+            proxy=proxy,
+            follow_redirects=True,
+        )
+        return AsyncSupabaseAuthClient(
+            url=auth_url,
+            auto_refresh_token=client_options.auto_refresh_token,
+            persist_session=client_options.persist_session,
+            storage=client_options.storage,
+            headers=client_options.headers,
+            http_client=http_client,
+            flow_type=client_options.flow_type,
+            verify=verify,
+            proxy=proxy,
+        )
+
+    @staticmethod
+    def _init_storage_client(
+        storage_url: str,
+        headers: dict[str, str],
+        storage_client_timeout: int = DEFAULT_STORAGE_CLIENT_TIMEOUT,
+        verify: bool = True,
+        proxy: str | None = None,
+    ) -> AsyncStorageClient:
+        # uploads, signed urls and downloads all go through this one session
+        return PooledAsyncStorageClient(
+            storage_url, headers, storage_client_timeout, verify, proxy
+        )
+
+
+async def create_super_client() -> AsyncClient:
+    """create the shared super client once at life span start"""
+    client: AsyncClient = await SharedAsyncClient.create(
         settings.SUPABASE_URL,
         settings.SUPABASE_KEY,
         options=AsyncClientOptions(
-            postgrest_client_timeout=10, storage_client_timeout=10
+            postgrest_client_timeout=10,
+            storage_client_timeout=10,
+            auto_refresh_token=False,
+            persist_session=False,
         ),
     )
+    return client
+
+
+async def get_super_client(request: Request) -> AsyncClient:
+    """for validation access_token init at life span event"""
+    super_client: AsyncClient | None = getattr(
+        request.app.state, "super_client", None
+    )
     if not super_client:
         raise HTTPException(status_code=500, detail="Super client not initialized")
     return super_client
@@ -34,8 +139,8 @@ async def get_super_client() -> AsyncClient:
 SuperClient = Annotated[AsyncClient, Depends(get_super_client)]
 
 
-# get token from cookies
-def get_token_from_cookie(access_token: str | None = Cookie(None)) -> str:
+# get token from cookies, async so FastAPI does not hand it to the threadpool
+async def get_token_from_cookie(access_token: str | None = Cookie(None)) -> str:
     """Extract access token from cookie"""
     if not access_token:
         raise HTTPException(status_code=401, detail="Access token not found")
@@ -44,17 +149,130 @@ def get_token_from_cookie(access_token: str | None = Cookie(None)) -> str:
 
 TokenDep = Annotated[str, Depends(get_token_from_cookie)]
 
+USER_CACHE_TTL = 60
+
+
+def _user_ttu(_key: bytes, entry: tuple[float, UserIn], now: float) -> float:
+    # never keep a user around past the expiry of the token itself
+    return min(now + USER_CACHE_TTL, entry[0])
+
+
+# users of verified tokens as (token exp, user), keyed by token digest so raw
+# tokens are never kept
+_user_cache: TLRUCache[bytes, tuple[float, UserIn]] = TLRUCache(
+    maxsize=10_000, ttu=_user_ttu, timer=time.time
+)
+# supabase user lookups in flight, keyed like the caches
+_user_lookups: dict[bytes, asyncio.Future[UserIn]] = {}
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _token_exp(token: str) -> float:
+    """exp of a token supabase already accepted, so it can be trusted as is"""
+    unverified = jwt.decode(token, options={"verify_signature": False})
+    return float(unverified.get("exp", time.time() + USER_CACHE_TTL))
+
+
+def forget_token(token: str) -> None:
+    """drop the cached user of a token, e.g. on logout"""
+    _user_cache.pop(_token_key(token), None)
+
+
+def decode_access_token(token: str) -> dict[str, Any]:
+    """verify access token locally with the project JWT secret"""
+    if not settings.SUPABASE_JWT_SECRET:
+        raise jwt.InvalidKeyError("SUPABASE_JWT_SECRET is not set")
+    return jwt.decode(
+        token,
+        settings.SUPABASE_JWT_SECRET,
+        algorithms=["HS256"],
+        audience="authenticated",
+        options={"require": ["exp", "sub"]},
+    )
+
+
+async def update_user_password(
+    super_client: AsyncClient, token: str, password: str
+) -> None:
+    """change the password as the user owning the token, never through the
+    admin API. GoTrue checks the session behind the token itself, so revoked
+    sessions and its secure password change rules still apply"""
+    # the same PUT /user gotrue's update_user sends, with the user's token
+    # instead of the session stored on the shared client
+    await super_client.auth._request(
+        "PUT",
+        "user",
+        jwt=token,
+        body={"password": password},
+    )
+
+
+def _user_from_claims(claims: dict[str, Any], token: str) -> UserIn:
+    """user of a locally verified token, built from its claims without
+    validation. Fields supabase does not put in the token keep their defaults
+    or stay unset (e.g. created_at)"""
+    return UserIn.model_construct(
+        id=claims["sub"],
+        aud=claims.get("aud", "authenticated"),
+        role=claims.get("role"),
+        email=claims.get("email"),
+        phone=claims.get("phone"),
+        app_metadata=claims.get("app_metadata", {}),
+        user_metadata=claims.get("user_metadata", {}),
+        is_anonymous=claims.get("is_anonymous", False),
+        access_token=token,
+    )
+
+
+async def get_current_user(token: TokenDep, request: Request) -> UserIn:
+    """get current user from token and validate same time. The token is
+    verified locally when SUPABASE_JWT_SECRET is set, supabase is only asked
+    when it is not, and then at most every USER_CACHE_TTL seconds. The
+    super client is only looked up for that remote call"""
+    key = _token_key(token)
+    cached = _user_cache.get(key)
+    if cached is not None:
+        return cached[1]
+    try:
+        claims = decode_access_token(token)
+    except jwt.ExpiredSignatureError:
+        raise TokenExpiredException("Token expired")
+    except jwt.InvalidKeyError:
+        # no project secret configured, only supabase can verify the token
+        pass
+    except jwt.PyJWTError:
+        # bad signature, audience or claims, not worth a supabase round trip
+        raise TokenExpiredException("Invalid token")
+    else:
+        user = _user_from_claims(claims, token)
+        _user_cache[key] = (claims["exp"], user)
+        return user
+    # concurrent requests with the same uncached token share one lookup
+    task = _user_lookups.get(key)
+    if task is None:
+        super_client = await get_super_client(request)
+        task = asyncio.ensure_future(_fetch_user(token, super_client))
+        _user_lookups[key] = task
+        task.add_done_callback(lambda _: _user_lookups.pop(key, None))
+    # shielded, a cancelled request must not cancel the lookup of the others
+    return await asyncio.shield(task)
+
 
-async def get_current_user(token: TokenDep, super_client: SuperClient) -> UserIn:
-    """get current user from token and validate same time"""
+async def _fetch_user(token: str, super_client: AsyncClient) -> UserIn:
+    """ask supabase for the user of a token and cache it"""
     try:
         user_rsp = await super_client.auth.get_user(jwt=token)
         if not user_rsp:
-            logging.error("User not found")
+            logger.error("User not found")
             raise TokenExpiredException("User not found")
-        return UserIn(**user_rsp.user.model_dump(), access_token=token)
+        user = UserIn(**user_rsp.user.model_dump(), access_token=token)
+        _user_cache[_token_key(token)] = (_token_exp(token), user)
+        return user
     except TokenExpiredException:
         raise
     except Exception as e:
-        logging.error(f"Auth error: {str(e)}")
+        logger.error("Auth error: %s", e)
         raise TokenExpiredException(f"Authentication failed: {str(e)}")
@@ -40,6 +40,9 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
 
+    # NOTE: per worker limits on signup, login and password reset
+    RATE_LIMIT_ENABLED: bool = True
+
     FRONTEND_HOST: str = "http://localhost:5173"
     BACKEND_CORS_ORIGINS: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = (
         []
@@ -58,6 +61,8 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     # NOTE: super user key is service_role key instead of the anon key
     SUPABASE_KEY: str
+    # NOTE: JWT secret of the project, access tokens are verified locally when set
+    SUPABASE_JWT_SECRET: str = ""
 
     POSTGRES_SERVER: str
     POSTGRES_PORT: int = 5432
@@ -1,8 +1,41 @@
 """Cookie utilities for authentication."""
-from datetime import datetime, timedelta, timezone
+import re
 
 from fastapi import Response
 
+# Set-Cookie values prebuilt for the hot login/refresh paths, same attributes
+# as set_cookie(httponly=True, secure=False, samesite="lax", path="/")
+_COOKIE_TMPL = "{}={}; HttpOnly; Max-Age={}; Path=/; SameSite=lax"
+# deletions also carry a fixed past Expires for clients ignoring Max-Age,
+# where delete_cookie would format the current time on every call
+_CLEAR_TMPL = (
+    '{}=""; expires=Thu, 01 Jan 1970 00:00:00 GMT; HttpOnly; Max-Age=0; '
+    "Path=/; SameSite=lax"
+)
+_CLEAR_ACCESS = _CLEAR_TMPL.format("access_token").encode()
+_CLEAR_REFRESH = _CLEAR_TMPL.format("refresh_token").encode()
+
+# JWTs and refresh tokens never need quoting, anything else goes through
+# Starlette's set_cookie
+_PLAIN_VALUE = re.compile(r"[A-Za-z0-9._\-]*")
+
+
+def _append_cookie(response: Response, key: str, value: str, max_age: int) -> None:
+    if _PLAIN_VALUE.fullmatch(value):
+        response.raw_headers.append(
+            (b"set-cookie", _COOKIE_TMPL.format(key, value, max_age).encode())
+        )
+    else:
+        response.set_cookie(
+            key=key,
+            value=value,
+            max_age=max_age,
+            httponly=True,
+            secure=False,
+            samesite="lax",
+            path="/",
+        )
+
 
 def set_auth_cookies(
     response: Response,
@@ -21,34 +54,12 @@ def set_auth_cookies(
         max_age: Access token cookie max age in seconds (default: 1 hour)
         refresh_max_age: Refresh token cookie max age in seconds (default: 7 days)
     """
-    # Use UTC timezone for expiry dates
-    expires = datetime.now(timezone.utc) + timedelta(seconds=max_age)
-    
-    # Set access token cookie (HttpOnly, Secure, SameSite)
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        max_age=max_age,
-        expires=expires,
-        httponly=True,  # Not accessible from JavaScript
-        secure=False,  # Set to True in production (HTTPS only)
-        samesite="lax",  # CSRF protection
-        path="/",
-    )
+    # HttpOnly, SameSite=lax; set Secure once served over HTTPS only
+    _append_cookie(response, "access_token", access_token, max_age)
 
     # Set refresh token cookie if provided
     if refresh_token:
-        refresh_expires = datetime.now(timezone.utc) + timedelta(seconds=refresh_max_age)
-        response.set_cookie(
-            key="refresh_token",
-            value=refresh_token,
-            max_age=refresh_max_age,
-            expires=refresh_expires,
-            httponly=True,
-            secure=False,  # Set to True in production
-            samesite="lax",
-            path="/",
-        )
+        _append_cookie(response, "refresh_token", refresh_token, refresh_max_age)
 
 
 def clear_auth_cookies(response: Response) -> None:
@@ -58,15 +69,5 @@ def clear_auth_cookies(response: Response) -> None:
     Args:
         response: FastAPI Response object
     """
-    response.delete_cookie(
-        key="access_token",
-        path="/",
-        httponly=True,
-        samesite="lax",
-    )
-    response.delete_cookie(
-        key="refresh_token",
-        path="/",
-        httponly=True,
-        samesite="lax",
-    )
+    response.raw_headers.append((b"set-cookie", _CLEAR_ACCESS))
+    response.raw_headers.append((b"set-cookie", _CLEAR_REFRESH))
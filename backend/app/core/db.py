@@ -1,6 +1,8 @@
-from collections.abc import Generator
+from collections.abc import AsyncIterator
 
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from supabase import create_client
 
 from app.core.config import settings
@@ -10,11 +12,32 @@ from app.models import User
 # otherwise, SQLModel might fail to initialize relationships properly
 # for more details: https://github.com/fastapi/full-stack-fastapi-template/issues/28
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+# sync engine for the pre start and init data scripts
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=10,
+    pool_recycle=1800,
+)
 
+# async engine for request handlers and background tasks, psycopg 3 speaks
+# asyncio natively
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=10,
+    pool_recycle=1800,
+    query_cache_size=1200,
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
 
-def get_db() -> Generator[Session, None]:
-    with Session(engine) as session:
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as session:
         yield session
 
 
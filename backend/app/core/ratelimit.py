@@ -0,0 +1,44 @@
+"""In-process rate limiting for unauthenticated endpoints."""
+import math
+import time
+
+from cachetools import TTLCache
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+
+
+class RateLimiter:
+    """
+    Per client token bucket, used as a route dependency.
+
+    Buckets live in process memory, so limits apply per worker. Client
+    addresses come from request.client, run uvicorn with --proxy-headers
+    behind a trusted proxy so X-Forwarded-For is honored.
+    """
+
+    def __init__(self, limit: int, period: float, maxsize: int = 10_000):
+        self.capacity = float(limit)
+        self.rate = limit / period
+        # an idle bucket refills completely within period, so drop it then
+        self._buckets: TTLCache[str, tuple[float, float]] = TTLCache(
+            maxsize=maxsize, ttl=period
+        )
+
+    # async without any awaits, FastAPI then runs it on the event loop
+    # instead of a threadpool worker, which also keeps bucket updates atomic
+    async def __call__(self, request: Request) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        key = request.client.host if request.client else "unknown"
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil((1 - tokens) / self.rate))},
+            )
+        self._buckets[key] = (tokens - 1, now)
@@ -10,20 +10,26 @@ from fastapi.responses import JSONResponse
 from uvicorn.config import LOGGING_CONFIG
 
 from app.api.main import api_router
-from app.core.auth import TokenExpiredException
+from app.core.auth import TokenExpiredException, create_super_client
 from app.core.config import settings
-from app.utils import custom_generate_unique_id
+from app.services.everypixel import close_everypixel
+from app.utils import custom_generate_unique_id, warm_route_dependants
 
 logger = logging.getLogger("uvicorn")
 
 
 @asynccontextmanager
-async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:  # noqa ARG001
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """life span events"""
     try:
         logger.info("lifespan start")
+        app.state.super_client = await create_super_client()
         yield
     finally:
+        if getattr(app.state, "super_client", None):
+            await app.state.super_client.auth.close()
+            await app.state.super_client.storage.aclose()
+        await close_everypixel()
         logger.info("lifespan exit")
 
 
@@ -66,6 +72,9 @@ async def read_root() -> dict[str, str]:
     return {"Hello": "World"}
 
 
+warm_route_dependants(app.router.routes)
+
+
 # Logger
 def timestamp_log_config(uvicorn_log_config: dict[str, Any]) -> dict[str, Any]:
     """https://github.com/fastapi/fastapi/discussions/7457#discussioncomment-5565969"""
@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel
 
 from app.models.base import InDBBase
@@ -27,6 +28,9 @@ class ImageUpdate(ImageBase):
 # Database model
 class Image(InDBBase, ImageBase, table=True):
     __tablename__ = "images"
+    __table_args__ = (
+        Index("ix_images_user_id_uploaded_at", "user_id", text("uploaded_at DESC")),
+    )
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
 
 
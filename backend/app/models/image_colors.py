@@ -1,3 +1,5 @@
+import uuid
+
 from sqlalchemy import Column, ForeignKey
 from sqlalchemy.dialects.postgresql import CITEXT
 from sqlmodel import Field, SQLModel
@@ -10,7 +12,7 @@ class Color(SQLModel, table=True):
 
 class ImageColor(SQLModel, table=True):
     __tablename__ = "image_colors"
-    image_id: str = Field(
+    image_id: uuid.UUID = Field(
         sa_column=Column(
             ForeignKey(
                 "images.id",
@@ -1,9 +1,11 @@
 import uuid
+from collections.abc import Callable
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Any, Optional
 
-from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, ForeignKey
+import numpy as np
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import Column, ForeignKey, Index
 from sqlmodel import Field, SQLModel
 
 from app.models.base import InDBBase
@@ -12,11 +14,31 @@ TAG_DIM = 4096
 COLOR_DIM = 12
 
 
+class Float32Vector(HALFVEC):  # type: ignore[misc]  # untyped pgvector base
+    """pgvector halfvec column, stored at half precision and loaded into a
+    contiguous float32 array"""
+
+    cache_ok = True
+
+    def result_processor(self, dialect: Any, coltype: Any) -> Callable[[Any], Any]:
+        def process(value: Any) -> Any:
+            if value is None or isinstance(value, np.ndarray):
+                return value
+            return np.array(value[1:-1].split(","), dtype=np.float32)
+
+        return process
+
+
 class ImageMetadataBase(SQLModel):
     description: Optional[str] = None
-    tag_vec: list[float] | None = Field(default=None, sa_column=Column(Vector(TAG_DIM)))
+    # both vectors are L2-normalized when written (app.utils.vectors), so an
+    # inner product is already the cosine similarity. Components are stored as
+    # halfvec, plenty for unit vectors and half the heap, TOAST and index bytes
+    tag_vec: list[float] | None = Field(
+        default=None, sa_column=Column(Float32Vector(TAG_DIM))
+    )
     color_vec: list[float] | None = Field(
-        default=None, sa_column=Column(Vector(COLOR_DIM))
+        default=None, sa_column=Column(Float32Vector(COLOR_DIM))
     )
     ai_processing_status: str = Field(max_length=20, default="pending")
 
@@ -31,6 +53,17 @@ class ImageMetadataUpdate(ImageMetadataBase):
 
 class ImageMetadata(InDBBase, ImageMetadataBase, table=True):
     __tablename__ = "image_metadata"
+    __table_args__ = (
+        Index("ix_image_metadata_image_id", "image_id", unique=True),
+        Index("ix_image_metadata_user_id", "user_id"),
+        # backs description ILIKE '%...%'
+        Index(
+            "ix_image_metadata_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
     image_id: uuid.UUID = Field(
         sa_column=Column(
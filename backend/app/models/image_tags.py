@@ -1,6 +1,7 @@
+import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index, Text, cast, column
 from sqlalchemy.dialects.postgresql import CITEXT
 from sqlmodel import Field, SQLModel
 
@@ -13,8 +14,18 @@ class Tag(SQLModel, table=True):
 
 class ImageTag(SQLModel, table=True):
     __tablename__ = "image_tags"
+    __table_args__ = (
+        # gin_trgm_ops is defined for text, not citext, so the index is on the
+        # cast and tag filters match tag_name::text ILIKE '%...%'
+        Index(
+            "ix_image_tags_tag_name_trgm",
+            cast(column("tag_name"), Text).label("tag_name_text"),
+            postgresql_using="gin",
+            postgresql_ops={"tag_name_text": "gin_trgm_ops"},
+        ),
+    )
 
-    image_id: str = Field(
+    image_id: uuid.UUID = Field(
         sa_column=Column(
             ForeignKey(
                 "images.id",
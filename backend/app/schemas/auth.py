@@ -1,3 +1,6 @@
+from functools import cached_property
+from uuid import UUID
+
 from gotrue import User, UserAttributes  # type: ignore
 from pydantic import BaseModel, EmailStr, Field
 
@@ -11,7 +14,10 @@ class Token(BaseModel):
 
 # request
 class UserIn(Token, User):  # type: ignore
-    pass
+    @cached_property
+    def uuid(self) -> UUID:
+        """user id parsed once per request"""
+        return UUID(self.id)
 
 
 # Properties to receive via API on creation
@@ -48,6 +48,7 @@ class PaginatedImagesResponse(BaseModel):
     total: int  # Total items available
     page: int  # Current page number
     page_size: int  # Items per page
+    next_cursor: Optional[str] = None  # Pass as cursor to fetch the next page
     message: str = "Images retrieved successfully"
 
 
@@ -2,21 +2,133 @@
 
 import asyncio
 import logging
+import os
+from datetime import datetime, timezone
+from typing import Any
 from uuid import UUID
 
-from sqlmodel import Session, select
+from cachetools import TTLCache
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from storage3._async.file_api import AsyncBucketProxy
 
-from app.core.config import settings
-from app.core.db import engine
+from app.core.db import AsyncSessionLocal
 from app.models.image import Image
 from app.models.image_colors import Color, ImageColor
 from app.models.image_metadata import ImageMetadata
 from app.models.image_tags import ImageTag, Tag
-from app.services.everypixel import EveryPixelService
+from app.services.everypixel import get_everypixel
 from app.utils.vectors import color_vector, tag_vector
 
 logger = logging.getLogger(__name__)
 
+# tag names and color hexes known to exist, the vocabulary saturates quickly
+# so most images only need their link rows inserted
+_known_tags: TTLCache[str, bool] = TTLCache(maxsize=100_000, ttl=3600)
+_known_colors: TTLCache[str, bool] = TTLCache(maxsize=100_000, ttl=3600)
+
+
+async def _set_status(image_id: UUID, status: str) -> None:
+    """Set ai_processing_status of an image."""
+    async with AsyncSessionLocal() as session:
+        statement = select(ImageMetadata).where(ImageMetadata.image_id == image_id)
+        db_metadata = (await session.exec(statement)).first()
+        if db_metadata:
+            db_metadata.ai_processing_status = status
+            session.add(db_metadata)
+            await session.commit()
+
+
+async def _delete_image(image_id: UUID) -> None:
+    """Remove an image record."""
+    async with AsyncSessionLocal() as session:
+        db_image = await session.get(Image, image_id)
+        if db_image:
+            # cascades to the metadata record
+            await session.delete(db_image)
+            await session.commit()
+
+
+async def _save_results(
+    image_id: UUID,
+    user_id: UUID,
+    caption: str | None,
+    keywords: list[str],
+    colors_hex: list[str],
+    tag_vec: list[float] | None,
+    color_vec: list[float] | None,
+) -> None:
+    """Write AI results, tags and colors of an image. Keywords and colors
+    arrive lowercased and without duplicates."""
+    async with AsyncSessionLocal() as session:
+        # Get or create metadata
+        statement = select(ImageMetadata).where(ImageMetadata.image_id == image_id)
+        db_metadata = (await session.exec(statement)).first()
+
+        if not db_metadata:
+            db_metadata = ImageMetadata(
+                image_id=image_id,
+                user_id=user_id,
+            )
+
+        # Update with AI results and vectors
+        db_metadata.description = caption
+        db_metadata.tag_vec = tag_vec
+        db_metadata.color_vec = color_vec
+        db_metadata.ai_processing_status = "completed"
+
+        session.add(db_metadata)
+
+        # Tags, colors and their links are written with one bulk insert each,
+        # rows that already exist are skipped by the database. Tags and colors
+        # this worker stored recently are not inserted again at all
+        new_tags = [name for name in keywords if name not in _known_tags]
+        if new_tags:
+            now = datetime.now(timezone.utc)
+            await session.execute(
+                insert(Tag)
+                .values([{"name": name, "created_at": now} for name in new_tags])
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+        if keywords:
+            await session.execute(
+                insert(ImageTag)
+                .values(
+                    [{"image_id": image_id, "tag_name": name} for name in keywords]
+                )
+                .on_conflict_do_nothing(index_elements=["image_id", "tag_name"])
+            )
+
+        new_colors = [
+            hex_code for hex_code in colors_hex if hex_code not in _known_colors
+        ]
+        if new_colors:
+            await session.execute(
+                insert(Color)
+                .values([{"hex": hex_code} for hex_code in new_colors])
+                .on_conflict_do_nothing(index_elements=["hex"])
+            )
+        if colors_hex:
+            await session.execute(
+                insert(ImageColor)
+                .values(
+                    [
+                        {"image_id": image_id, "color_hex": hex_code}
+                        for hex_code in colors_hex
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["image_id", "color_hex"])
+            )
+
+        await session.commit()
+        _known_tags.update(dict.fromkeys(new_tags, True))
+        _known_colors.update(dict.fromkeys(new_colors, True))
+
+        logger.info(
+            f"Image processing completed for {image_id}. "
+            f"Extracted {len(keywords)} keywords and {len(colors_hex)} colors"
+        )
+
 
 async def process_image_async(
     image_id: UUID,
@@ -34,21 +146,31 @@ async def process_image_async(
     try:
         logger.info(f"Starting async image processing for {image_id}")
 
-        service = EveryPixelService(
-            settings.EVERYPIXEL_API_BASE_URL,
-            settings.EVERYPIXEL_CLIENT_ID,
-            settings.EVERYPIXEL_CLIENT_SECRET,
-        )
-
-        keywording_data = await service.keywords_by_url(
-            signed_url,
-            num_keywords=5,
-            colors=True,
-            num_colors=3,
-            lang="en",
+        service = get_everypixel()
+
+        # keywording and captioning are independent requests, run them together
+        keywording_data: dict[str, Any] | BaseException | None
+        captioning_data: dict[str, Any] | BaseException | None
+        keywording_data, captioning_data = await asyncio.gather(
+            service.keywords_by_url(
+                signed_url,
+                num_keywords=5,
+                colors=True,
+                num_colors=3,
+                lang="en",
+            ),
+            service.captions_by_url(signed_url),
+            return_exceptions=True,
         )
-
-        captioning_data = await service.captions_by_url(signed_url)
+        # one failed request must not discard the result of the other
+        if isinstance(keywording_data, BaseException):
+            logger.error(f"Keywording failed for {image_id}: {str(keywording_data)}")
+            keywording_data = None
+        if isinstance(captioning_data, BaseException):
+            logger.error(f"Captioning failed for {image_id}: {str(captioning_data)}")
+            captioning_data = None
+        if keywording_data is None and captioning_data is None:
+            raise RuntimeError("EveryPixel returned no results")
 
         # Extract keywords and colors
         keywords = []
@@ -57,10 +179,21 @@ async def process_image_async(
 
         if keywording_data and keywording_data.get("status") == "ok":
             if keywording_data.get("keywords"):
-                keywords = [kw["keyword"] for kw in keywording_data["keywords"]]
+                # synonyms can map to the same keyword, keep each one once so
+                # vectors, inserts and caches all see unique values
+                keywords = list(
+                    dict.fromkeys(
+                        kw["keyword"].strip().lower()
+                        for kw in keywording_data["keywords"]
+                    )
+                )
 
             if keywording_data.get("colors"):
-                colors_hex = [color["hex"] for color in keywording_data["colors"]]
+                colors_hex = list(
+                    dict.fromkeys(
+                        color["hex"].lower() for color in keywording_data["colors"]
+                    )
+                )
 
             logger.info(
                 f"Extracted {len(keywords)} keywords and {len(colors_hex)} colors for {image_id}"
@@ -81,111 +214,119 @@ async def process_image_async(
         )
 
         # Update database with results
-        with Session(engine) as session:
-            # Get or create metadata
-            statement = select(ImageMetadata).where(ImageMetadata.image_id == image_id)
-            db_metadata = session.exec(statement).first()
-
-            if not db_metadata:
-                db_metadata = ImageMetadata(
-                    image_id=image_id,
-                    user_id=user_id,
-                )
-
-            # Update with AI results and vectors
-            db_metadata.description = caption
-            db_metadata.tag_vec = tag_vec
-            db_metadata.color_vec = color_vec
-            db_metadata.ai_processing_status = "completed"
-
-            session.add(db_metadata)
-            session.commit()
-
-            # Save keywords to tags table
-            for keyword in keywords:
-                # Get or create tag
-                tag_statement = select(Tag).where(Tag.name == keyword.lower())
-                db_tag = session.exec(tag_statement).first()
-
-                if not db_tag:
-                    db_tag = Tag(name=keyword.lower())
-                    session.add(db_tag)
-                    session.commit()
-
-                # Create relationship between image and tag
-                image_tag_statement = select(ImageTag).where(
-                    (ImageTag.image_id == str(image_id))
-                    & (ImageTag.tag_name == keyword.lower())
-                )
-                if not session.exec(image_tag_statement).first():
-                    db_image_tag = ImageTag(
-                        image_id=str(image_id),
-                        tag_name=keyword.lower(),
-                    )
-                    session.add(db_image_tag)
-
-            session.commit()
-
-            # Save colors to colors table
-            for color_hex in colors_hex:
-                # Get or create color
-                color_statement = select(Color).where(Color.hex == color_hex.lower())
-                db_color = session.exec(color_statement).first()
-
-                if not db_color:
-                    db_color = Color(hex=color_hex.lower())
-                    session.add(db_color)
-                    session.commit()
-
-                # Create relationship between image and color
-                image_color_statement = select(ImageColor).where(
-                    (ImageColor.image_id == str(image_id))
-                    & (ImageColor.color_hex == color_hex.lower())
-                )
-                if not session.exec(image_color_statement).first():
-                    db_image_color = ImageColor(
-                        image_id=str(image_id),
-                        color_hex=color_hex.lower(),
-                    )
-                    session.add(db_image_color)
-
-            session.commit()
-
-            logger.info(
-                f"Image processing completed for {image_id}. "
-                f"Extracted {len(keywords)} keywords and {len(colors_hex)} colors"
-            )
+        await _save_results(
+            image_id,
+            user_id,
+            caption,
+            keywords,
+            colors_hex,
+            tag_vec,
+            color_vec,
+        )
 
     except Exception as e:
         logger.error(f"Error processing image {image_id}: {str(e)}")
         # Update status to failed
         try:
-            with Session(engine) as session:
-                statement = select(ImageMetadata).where(
-                    ImageMetadata.image_id == image_id
-                )
-                db_metadata = session.exec(statement).first()
-                if db_metadata:
-                    db_metadata.ai_processing_status = "failed"
-                    session.add(db_metadata)
-                    session.commit()
+            await _set_status(image_id, "failed")
         except Exception as e2:
             logger.error(f"Error updating metadata status: {str(e2)}")
 
 
-def process_image_background(
+async def _upload_content(
+    bucket: AsyncBucketProxy,
+    file_path: str,
+    content: bytes | str,
+    content_type: str,
+) -> None:
+    """Upload bytes, or stream a temporary file and remove it afterwards."""
+    file_options = {"content-type": content_type}
+    if isinstance(content, bytes):
+        await bucket.upload(path=file_path, file=content, file_options=file_options)
+        return
+    try:
+        with open(content, "rb") as f:
+            await bucket.upload(path=file_path, file=f, file_options=file_options)
+    finally:
+        os.unlink(content)
+
+
+async def _store_file(
+    bucket: AsyncBucketProxy,
     image_id: UUID,
     file_path: str,
+    content: bytes | str,
+    content_type: str,
+) -> bool:
+    """Upload one file, returns False after removing its record on failure."""
+    try:
+        await _upload_content(bucket, file_path, content, content_type)
+        logger.info(f"File uploaded: {file_path}")
+    except Exception as e:
+        logger.error(f"Storage upload error for {file_path}: {str(e)}")
+        try:
+            await _delete_image(image_id)
+        except Exception as e2:
+            logger.error(f"Error removing image record: {str(e2)}")
+        return False
+
+    await _set_status(image_id, "pending")
+    return True
+
+
+async def store_uploads_async(
+    bucket: AsyncBucketProxy,
+    uploads: list[tuple[UUID, str, bytes | str, str]],
     user_id: UUID,
-    signed_url: str,
 ) -> None:
-    """Sync wrapper for async image processing to work with BackgroundTasks."""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    loop.run_until_complete(
-        process_image_async(image_id, file_path, user_id, signed_url)
+    """
+    Upload accepted images to storage in background.
+
+    - Upload each (image_id, file_path, content, content_type) to the bucket,
+      content being the bytes or the path of a temporary file holding them
+    - Mark metadata as pending and remove the image record if its upload fails
+    - Sign every stored path in one request and start AI processing
+    """
+    # uploads are independent and I/O bound, run them concurrently over the
+    # pooled HTTP/2 storage session
+    results = await asyncio.gather(
+        *[
+            _store_file(bucket, image_id, file_path, content, content_type)
+            for image_id, file_path, content, content_type in uploads
+        ],
+        return_exceptions=True,
     )
+    stored = []
+    for (image_id, file_path, _, _), result in zip(uploads, results, strict=True):
+        if isinstance(result, BaseException):
+            logger.error(f"Error storing {file_path}: {str(result)}")
+        elif result:
+            stored.append((image_id, file_path))
+
+    if not stored:
+        return
+
+    try:
+        res = await bucket.create_signed_urls([path for _, path in stored], 600)
+        signed_urls = {item["path"]: item["signedURL"] for item in res}
+    except Exception as e:
+        logger.warning(f"Could not schedule AI processing: {str(e)}")
+        # Continue anyway - images are uploaded, just won't have AI metadata
+        return
+
+    processing = []
+    for image_id, file_path in stored:
+        signed_url = signed_urls.get(file_path)
+        if not signed_url:
+            logger.warning(f"No signed URL returned for {file_path}")
+            continue
+        processing.append(
+            process_image_async(
+                image_id=image_id,
+                file_path=file_path,
+                user_id=user_id,
+                signed_url=signed_url,
+            )
+        )
+    # each call handles its own errors and marks its image as failed
+    await asyncio.gather(*processing)
@@ -1,7 +1,10 @@
+from functools import lru_cache
 from typing import Any, Dict
 
 import httpx
 
+from app.core.config import settings
+
 
 class EveryPixelService:
     def __init__(
@@ -15,6 +18,17 @@ class EveryPixelService:
         self.client_id = client_id
         self.client_secret = client_secret
         self.timeout = timeout
+        # one pooled client for every call, the keywording and captioning
+        # requests of an image share its HTTP/2 connection
+        self._client = httpx.AsyncClient(
+            auth=(client_id, client_secret),
+            timeout=timeout,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
 
     async def keywords_by_url(
         self,
@@ -25,7 +39,7 @@ class EveryPixelService:
         num_colors: int = 5,
         lang: str = "en",
     ) -> Dict[str, Any]:
-        params = {
+        params: Dict[str, str | int] = {
             "url": image_url,
             "num_keywords": num_keywords,
             "colors": str(colors),
@@ -33,13 +47,10 @@ class EveryPixelService:
             "lang": lang,
         }
 
-        async with httpx.AsyncClient(
-            auth=(self.client_id, self.client_secret),
-            timeout=self.timeout,
-        ) as client:
-            r = await client.get(f"{self.base_url}/keywords", params=params)
-            r.raise_for_status()
-            return r.json()
+        r = await self._client.get(f"{self.base_url}/keywords", params=params)
+        r.raise_for_status()
+        data: Dict[str, Any] = r.json()
+        return data
 
     async def captions_by_url(
         self,
@@ -49,10 +60,24 @@ class EveryPixelService:
             "url": image_url,
         }
 
-        async with httpx.AsyncClient(
-            auth=(self.client_id, self.client_secret),
-            timeout=self.timeout,
-        ) as client:
-            r = await client.get(f"{self.base_url}/image_captioning", params=params)
-            r.raise_for_status()
-            return r.json()
+        r = await self._client.get(f"{self.base_url}/image_captioning", params=params)
+        r.raise_for_status()
+        data: Dict[str, Any] = r.json()
+        return data
+
+
+@lru_cache
+def get_everypixel() -> EveryPixelService:
+    """shared service, built on first use instead of at import"""
+    return EveryPixelService(
+        base_url=settings.EVERYPIXEL_API_BASE_URL,
+        client_id=settings.EVERYPIXEL_CLIENT_ID,
+        client_secret=settings.EVERYPIXEL_CLIENT_SECRET,
+    )
+
+
+async def close_everypixel() -> None:
+    """close the shared service client, if it was ever built"""
+    if get_everypixel.cache_info().currsize:
+        await get_everypixel().aclose()
+        get_everypixel.cache_clear()
@@ -1,5 +1,26 @@
+from fastapi.dependencies.models import Dependant
 from fastapi.routing import APIRoute
+from starlette.routing import BaseRoute
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
+
+
+def _warm_dependant(dependant: Dependant) -> None:
+    for sub_dependant in dependant.dependencies:
+        _warm_dependant(sub_dependant)
+    # cached properties, evaluated once per dependant
+    _ = (
+        dependant.cache_key,
+        dependant.is_gen_callable,
+        dependant.is_async_gen_callable,
+        dependant.is_coroutine_callable,
+    )
+
+
+def warm_route_dependants(routes: list[BaseRoute]) -> None:
+    """run dependency introspection at startup instead of on first request"""
+    for route in routes:
+        if isinstance(route, APIRoute):
+            _warm_dependant(route.dependant)
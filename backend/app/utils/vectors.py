@@ -1,7 +1,6 @@
 """Vector generation utilities for tags and colors using hashing and binning."""
 from __future__ import annotations
 
-import colorsys
 from typing import Iterable, List
 
 import mmh3
@@ -26,6 +25,8 @@ COLOR_BINS = [
     "magenta",
 ]
 COLOR_DIM = len(COLOR_BINS)
+# below this many colors the scalar loop beats the array setup of the batch path
+COLOR_BATCH_MIN = 32
 
 
 # ========== TAGS ==========
@@ -40,26 +41,27 @@ def tag_vector(tags: Iterable[str], dim: int = TAG_DIM) -> List[float]:
     Returns:
         L2-normalized vector as list of floats
     """
-    v = np.zeros(dim, dtype=np.float32)
-    for t in tags:
-        if not t:
-            continue
-        idx = mmh3.hash(t.strip().lower(), signed=False) % dim
-        v[idx] += 1.0
+    toks = [t.strip().lower() for t in tags if t]
+    idx = np.fromiter(
+        (mmh3.hash(t, signed=False) for t in toks), dtype=np.uint32, count=len(toks)
+    )
+    # scatter-add every hashed tag into its bin in one pass
+    v = np.bincount(idx % dim, minlength=dim).astype(np.float32)
     n = np.linalg.norm(v)
-    return (v / n).tolist() if n else v.tolist()
+    vec: list[float] = (v / n).tolist() if n else v.tolist()
+    return vec
 
 
 # ========== COLORS ==========
-def _hex_to_hue_deg(hex_code: str) -> float:
+def _hex_to_rgb(hex_code: str) -> tuple[int, int, int]:
     """
-    Convert '#RRGGBB' to hue degrees [0, 360).
+    Parse '#RRGGBB' into integer channels [0, 255].
 
     Args:
         hex_code: Color in format '#RRGGBB'
 
     Returns:
-        Hue in degrees [0, 360)
+        (r, g, b) tuple
 
     Raises:
         ValueError: If hex code is malformed
@@ -67,17 +69,17 @@ def _hex_to_hue_deg(hex_code: str) -> float:
     s = hex_code.lstrip("#")
     if len(s) != 6:
         raise ValueError(f"Bad hex color: {hex_code}")
-    r = int(s[0:2], 16) / 255.0
-    g = int(s[2:4], 16) / 255.0
-    b = int(s[4:6], 16) / 255.0
-    h, _, _ = colorsys.rgb_to_hsv(r, g, b)  # h in [0,1)
-    return h * 360.0
+    r, g, b = bytes.fromhex(s)
+    return r, g, b
 
 
 def nearest_color_bin_index(hex_code: str) -> int:
     """
     Map a hex color to one of the 12 hue bins by simple 30° ranges.
 
+    The hue is computed in integers: within each sixth of the circle it is
+    sector + (x - y) / delta, and every sixth spans two 30° bins.
+
     Args:
         hex_code: Color in format '#RRGGBB'
 
@@ -87,8 +89,71 @@ def nearest_color_bin_index(hex_code: str) -> int:
     Raises:
         ValueError: If hex code is malformed
     """
-    h = _hex_to_hue_deg(hex_code)
-    return int(h // 30) % COLOR_DIM
+    r, g, b = _hex_to_rgb(hex_code)
+    mx = max(r, g, b)
+    d = mx - min(r, g, b)
+    if d == 0:
+        return 0  # grays have no hue
+    if r == mx:
+        half_sixths = 2 * (g - b) // d
+    elif g == mx:
+        half_sixths = 4 + 2 * (b - r) // d
+    else:
+        half_sixths = 8 + 2 * (r - g) // d
+    return half_sixths % COLOR_DIM
+
+
+def _parse_hex_colors(hex_colors: Iterable[str]) -> np.ndarray:
+    """
+    Parse '#RRGGBB' strings into an (n, 3) uint8 array, skipping malformed ones.
+
+    Args:
+        hex_colors: Iterable of hex color strings ('#RRGGBB')
+
+    Returns:
+        RGB channels, one row per valid color
+    """
+    cleaned = [s for s in (hx.lstrip("#") for hx in hex_colors) if len(s) == 6]
+    try:
+        raw = bytes.fromhex("".join(cleaned))
+    except ValueError:
+        raw = b""
+    if len(raw) != 3 * len(cleaned):
+        # some entry is not hex, parse them one by one to drop it
+        parts = []
+        for s in cleaned:
+            try:
+                part = bytes.fromhex(s)
+            except ValueError:
+                continue
+            if len(part) == 3:
+                parts.append(part)
+        raw = b"".join(parts)
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+
+
+def _hue_bins(rgb: np.ndarray) -> np.ndarray:
+    """
+    Vectorized nearest_color_bin_index over an (n, 3) RGB array.
+
+    Args:
+        rgb: RGB channels, one row per color
+
+    Returns:
+        Index into COLOR_BINS (0-11) per color
+    """
+    rgb = rgb.astype(np.int32)
+    r, g, b = rgb.T
+    mx = rgb.max(axis=1)
+    d = mx - rgb.min(axis=1)
+    safe_d = np.where(d == 0, 1, d)
+    half_sixths = np.where(
+        r == mx,
+        2 * (g - b) // safe_d,
+        np.where(g == mx, 4 + 2 * (b - r) // safe_d, 8 + 2 * (r - g) // safe_d),
+    )
+    # grays have no hue
+    return np.where(d == 0, 0, half_sixths % COLOR_DIM)
 
 
 def color_vector(hex_colors: Iterable[str], dim: int = COLOR_DIM) -> List[float]:
@@ -96,19 +161,24 @@ def color_vector(hex_colors: Iterable[str], dim: int = COLOR_DIM) -> List[float]
     Count colors per hue bin, L2-normalized for cosine similarity.
 
     Args:
-        hex_colors: Iterable of hex color strings ('#RRGGBB')
-        dim: Dimension of output vector (default 12)
+        hex_colors: Iterable of hex color strings ('#RRGGBB'), malformed
+            codes are skipped
 
     Returns:
         L2-normalized vector as list of floats
     """
-    v = np.zeros(dim, dtype=np.float32)
-    for hx in hex_colors:
-        try:
-            v[nearest_color_bin_index(hx)] += 1.0
-        except Exception:
-            # skip malformed hex codes
-            continue
+    hex_colors = list(hex_colors)
+    if len(hex_colors) < COLOR_BATCH_MIN:
+        v = np.zeros(dim, dtype=np.float32)
+        for hx in hex_colors:
+            try:
+                v[nearest_color_bin_index(hx)] += 1.0
+            except Exception:
+                # skip malformed hex codes
+                continue
+    else:
+        bins = _hue_bins(_parse_hex_colors(hex_colors))
+        v = np.bincount(bins[bins < dim], minlength=dim).astype(np.float32)
     n = np.linalg.norm(v)
     return (v / n).tolist() if n else v.tolist()
 
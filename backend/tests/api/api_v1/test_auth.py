@@ -1,166 +1,317 @@
+import asyncio
+import time
+import uuid
+from types import SimpleNamespace
+
+import jwt
+import orjson
 import pytest
-from httpx import AsyncClient
+from fastapi import HTTPException, Request
+from httpx import ASGITransport, AsyncClient
+from pydantic import ValidationError
 
-from app.main import app
+from app.api.routes import auth
+from app.core.auth import TokenExpiredException, forget_token, get_current_user
+from app.core.config import settings
+from app.core.ratelimit import RateLimiter
+from app.main import app, token_expired_exception_handler
+from app.schemas.auth import SignupRequest, UpdatePasswordRequest
+from tests.utils import FakeGoTrue, NullEmailAuth, random_email
 
-BASE_URL = "http://test"
+# static bodies serialized once instead of by httpx on every request
+JSON_HEADERS = {"content-type": "application/json"}
+INVALID_LOGIN = orjson.dumps(
+    {"email": "nonexistent@example.com", "password": "wrongpassword"}
+)
+INVALID_REFRESH = orjson.dumps({"refresh_token": "invalid_refresh_token"})
+PASSWORD_RESET = orjson.dumps({"email": "test@example.com"})
 
 
 @pytest.mark.asyncio
-async def test_signup_success():
+async def test_signup_success(async_client: AsyncClient):
     """Test successful user signup"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/signup",
-            json={
-                "email": f"test_signup_{pytest.timestamp}@example.com",
-                "password": "password123",
-            },
-        )
-        assert response.status_code == 201
-        data = response.json()
-        assert "access_token" in data
-        assert data["email"] is not None
-
-
-@pytest.mark.asyncio
-async def test_signup_invalid_email():
-    """Test signup with invalid email"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/signup",
-            json={
-                "email": "not_an_email",
-                "password": "password123",
-            },
-        )
-        assert response.status_code == 422
-
-
-@pytest.mark.asyncio
-async def test_signup_short_password():
-    """Test signup with password too short"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/signup",
-            json={
-                "email": "test@example.com",
-                "password": "short",
-            },
-        )
-        assert response.status_code == 422
-
-
-@pytest.mark.asyncio
-async def test_login_success(test_user_email: str, test_user_password: str):
+    response = await async_client.post(
+        "/api/v1/auth/signup",
+        json={
+            "email": random_email(),
+            "password": "password123",
+        },
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert "access_token" in data
+    assert data["email"] is not None
+
+
+@pytest.mark.asyncio
+async def test_signup_sees_own_account():
+    """Test signup succeeds when the concurrent email lookup already sees the
+    account sign up just created"""
+    user_id = "5f7e2b6a-1111-2222-3333-444455556669"
+
+    async def sign_up(credentials: dict[str, str]) -> SimpleNamespace:
+        user = SimpleNamespace(id=user_id, email=credentials["email"])
+        return SimpleNamespace(user=user, session=None)
+
+    async def execute(*args: object, **kwargs: object) -> SimpleNamespace:
+        return SimpleNamespace(scalar=lambda: uuid.UUID(user_id))
+
+    client = SimpleNamespace(auth=SimpleNamespace(sign_up=sign_up))
+    user_data = SignupRequest(email="race@example.com", password="password123")
+
+    response = await auth.signup(user_data, client, SimpleNamespace(execute=execute))
+    assert response.data.user_id == user_id
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"email": "not_an_email", "password": "password123"},
+        {"email": "test@example.com", "password": "short"},
+    ],
+    ids=["invalid_email", "short_password"],
+)
+def test_signup_invalid_input(payload: dict[str, str]):
+    """Test signup rejects an invalid email or a password too short, the
+    request model is what the route answers 422 with"""
+    with pytest.raises(ValidationError):
+        SignupRequest.model_validate(payload)
+
+
+@pytest.mark.asyncio
+async def test_login_success(
+    async_client: AsyncClient, test_user_email: str, test_user_password: str
+):
     """Test successful login"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/login",
-            json={
-                "email": test_user_email,
-                "password": test_user_password,
-            },
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert "access_token" in data
-        assert data["user_id"] is not None
-
-
-@pytest.mark.asyncio
-async def test_login_invalid_credentials():
+    response = await async_client.post(
+        "/api/v1/auth/login",
+        json={
+            "email": test_user_email,
+            "password": test_user_password,
+        },
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert "access_token" in data
+    assert data["user_id"] is not None
+
+
+@pytest.mark.asyncio
+async def test_login_invalid_credentials(async_client: AsyncClient):
     """Test login with invalid credentials"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/login",
-            json={
-                "email": "nonexistent@example.com",
-                "password": "wrongpassword",
-            },
-        )
-        assert response.status_code == 401
+    response = await async_client.post(
+        "/api/v1/auth/login", content=INVALID_LOGIN, headers=JSON_HEADERS
+    )
+    assert response.status_code == 401
 
 
 @pytest.mark.asyncio
-async def test_get_current_user(test_access_token: str):
+async def test_get_current_user(async_client: AsyncClient, test_access_token: str):
     """Test getting current user info"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.get(
-            "/api/v1/auth/me",
-            headers={"Authorization": f"Bearer {test_access_token}"},
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["user_id"] is not None
-        assert data["email"] is not None
+    response = await async_client.get(
+        "/api/v1/auth/me",
+        headers={"Authorization": f"Bearer {test_access_token}"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user_id"] is not None
+    assert data["email"] is not None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("method", "path"),
+    [("GET", "/api/v1/auth/me"), ("POST", "/api/v1/auth/logout")],
+    ids=["me", "logout"],
+)
+async def test_missing_token_rejected(
+    async_client: AsyncClient, method: str, path: str
+):
+    """Test endpoints requiring a token reject a request without the cookie"""
+    # the shared client may hold cookies of an earlier login, this one does
+    # not but runs on the app the shared client started
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url=async_client.base_url
+    ) as client:
+        response = await client.request(method, path)
+    assert response.status_code == 401
 
 
 @pytest.mark.asyncio
-async def test_get_current_user_invalid_token():
-    """Test getting current user with invalid token"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.get(
-            "/api/v1/auth/me",
-            headers={"Authorization": "Bearer invalid_token"},
-        )
-        assert response.status_code == 401
+async def test_invalid_token_rejected(fake_gotrue: FakeGoTrue):
+    """Test the auth dependency rejects an invalid token with a 401"""
+    fake_gotrue.errors.append(RuntimeError("invalid JWT"))
+    request = fake_gotrue.request
+
+    with pytest.raises(TokenExpiredException) as exc_info:
+        await get_current_user("invalid_token", request)
+    response = await token_expired_exception_handler(request, exc_info.value)
+    assert response.status_code == 401
 
 
 @pytest.mark.asyncio
-async def test_refresh_token_success(test_refresh_token: str):
+async def test_refresh_token_success(
+    async_client: AsyncClient, test_refresh_token: str
+):
     """Test refreshing access token"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/refresh",
-            json={"refresh_token": test_refresh_token},
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert "access_token" in data
+    response = await async_client.post(
+        "/api/v1/auth/refresh",
+        json={"refresh_token": test_refresh_token},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert "access_token" in data
 
 
 @pytest.mark.asyncio
-async def test_refresh_token_invalid():
+async def test_refresh_token_invalid(async_client: AsyncClient):
     """Test refreshing with invalid refresh token"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/refresh",
-            json={"refresh_token": "invalid_refresh_token"},
-        )
-        assert response.status_code == 401
+    response = await async_client.post(
+        "/api/v1/auth/refresh", content=INVALID_REFRESH, headers=JSON_HEADERS
+    )
+    assert response.status_code == 401
 
 
 @pytest.mark.asyncio
-async def test_logout_success(test_access_token: str):
+async def test_logout_success(async_client: AsyncClient, test_access_token: str):
     """Test successful logout"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/logout",
-            headers={"Authorization": f"Bearer {test_access_token}"},
-        )
-        assert response.status_code == 204
+    response = await async_client.post(
+        "/api/v1/auth/logout",
+        headers={"Authorization": f"Bearer {test_access_token}"},
+    )
+    assert response.status_code == 204
 
 
 @pytest.mark.asyncio
-async def test_logout_invalid_token():
-    """Test logout with invalid token"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/logout",
-            headers={"Authorization": "Bearer invalid_token"},
-        )
-        assert response.status_code in [401, 400]
+async def test_password_reset_request(
+    async_client: AsyncClient, null_email_auth: NullEmailAuth
+):
+    """Test password reset request"""
+    response = await async_client.post(
+        "/api/v1/auth/password-reset", content=PASSWORD_RESET, headers=JSON_HEADERS
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert "message" in data
+    assert null_email_auth.reset_emails == ["test@example.com"]
 
 
 @pytest.mark.asyncio
-async def test_password_reset_request():
-    """Test password reset request"""
-    async with AsyncClient(app=app, base_url=BASE_URL) as client:
-        response = await client.post(
-            "/api/v1/auth/password-reset",
-            json={"email": "test@example.com"},
-        )
-        assert response.status_code == 202
-        data = response.json()
-        assert "message" in data
+async def test_update_password_uses_user_token(fake_gotrue: FakeGoTrue):
+    """Test the password is changed with the user's own token, not as admin"""
+    token = jwt.encode({"sub": "p", "exp": time.time() + 3600}, "secret")
+    update_data = UpdatePasswordRequest(access_token=token, new_password="newpass123")
+
+    await auth.update_password(update_data, fake_gotrue.client, fake_gotrue.request)
+    assert [(m, p, kw["jwt"], kw["body"]) for m, p, kw in fake_gotrue.requests] == [
+        ("PUT", "user", token, {"password": "newpass123"})
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_rejects_burst(monkeypatch: pytest.MonkeyPatch):
+    """Test the rate limiter answers 429 once a client used up its bucket"""
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter(limit=2, period=60)
+    request = Request({"type": "http", "client": ("10.0.0.1", 1234)})
+    other = Request({"type": "http", "client": ("10.0.0.2", 1234)})
+
+    await limiter(request)
+    await limiter(request)
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter(request)
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["Retry-After"] == "30"
+    await limiter(other)
+
+
+@pytest.mark.asyncio
+async def test_current_user_cached_per_token(fake_gotrue: FakeGoTrue):
+    """Test supabase is asked once per token until the user is forgotten"""
+    token = jwt.encode({"sub": "u", "exp": time.time() + 3600}, "secret")
+    request = fake_gotrue.request
+
+    first = await get_current_user(token, request)
+    second = await get_current_user(token, request)
+    assert first is second
+    assert first.access_token == token
+    assert len(fake_gotrue.calls) == 1
+
+    forget_token(token)
+    await get_current_user(token, request)
+    assert len(fake_gotrue.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_current_user_lookup_coalesced(fake_gotrue: FakeGoTrue):
+    """Test concurrent requests with one token share a single supabase call"""
+    token = jwt.encode({"sub": "c", "exp": time.time() + 3600}, "secret")
+    fake_gotrue.delay = 0.01
+
+    users = await asyncio.gather(
+        *[get_current_user(token, fake_gotrue.request) for _ in range(5)]
+    )
+    assert len(fake_gotrue.calls) == 1
+    assert all(u is users[0] for u in users)
+
+
+@pytest.mark.asyncio
+async def test_current_user_failure_not_cached(fake_gotrue: FakeGoTrue):
+    """Test a rejected token is looked up again instead of served from cache"""
+    token = jwt.encode({"sub": "f", "exp": time.time() + 3600}, "secret")
+    fake_gotrue.errors.append(RuntimeError("gotrue unavailable"))
+    request = fake_gotrue.request
+
+    with pytest.raises(TokenExpiredException):
+        await get_current_user(token, request)
+    assert (await get_current_user(token, request)).id == fake_gotrue.user.id
+    assert len(fake_gotrue.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_current_user_verified_locally(
+    fake_gotrue: FakeGoTrue, monkeypatch: pytest.MonkeyPatch
+):
+    """Test a token signed with the project secret needs no supabase call"""
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "test-secret")
+    token = jwt.encode(
+        {
+            "sub": "5f7e2b6a-1111-2222-3333-444455556666",
+            "aud": "authenticated",
+            "email": "local@example.com",
+            "exp": time.time() + 3600,
+        },
+        "test-secret",
+    )
+    request = fake_gotrue.request
+
+    user = await get_current_user(token, request)
+    assert user.id == "5f7e2b6a-1111-2222-3333-444455556666"
+    assert str(user.uuid) == user.id
+    assert user.email == "local@example.com"
+
+    expired = jwt.encode(
+        {"sub": "x", "aud": "authenticated", "exp": time.time() - 10}, "test-secret"
+    )
+    with pytest.raises(TokenExpiredException):
+        await get_current_user(expired, request)
+    assert fake_gotrue.calls == []
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_rejected_locally(
+    fake_gotrue: FakeGoTrue, monkeypatch: pytest.MonkeyPatch
+):
+    """Test tokens failing local verification never reach supabase"""
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "test-secret")
+    claims = {"sub": "x", "aud": "authenticated", "exp": time.time() + 3600}
+    tokens = [
+        jwt.encode(claims, "forged-secret"),
+        jwt.encode({**claims, "aud": "anon"}, "test-secret"),
+        jwt.encode({"aud": "authenticated", "exp": claims["exp"]}, "test-secret"),
+        "not-a-jwt",
+    ]
+    for token in tokens:
+        with pytest.raises(TokenExpiredException):
+            await get_current_user(token, fake_gotrue.request)
+    assert fake_gotrue.calls == []
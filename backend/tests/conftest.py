@@ -1,19 +1,33 @@
+import asyncio
+import sys
 import uuid
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from types import SimpleNamespace
 
 import pytest
+import pytest_asyncio
 from faker import Faker
 from fastapi.testclient import TestClient
-from gotrue import User
+from gotrue import Session as AuthSession, User
+from httpx import ASGITransport, AsyncClient
 from sqlmodel import Session, delete
 from supabase import Client, create_client
 
 from app import crud
+from app.core.auth import _user_cache, _user_lookups, get_super_client
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
 from app.models.item import Item, ItemCreate
 from app.schemas.auth import Token
+from tests.utils import TEST_EMAIL_PREFIX, FakeGoTrue, NullEmailAuth, random_email
+
+# run the whole session loop on uvloop, the httpx <-> ASGI round trip of every
+# test is faster on it. uvloop does not support Windows
+if sys.platform != "win32":
+    import uvloop
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 
 @pytest.fixture(scope="module")
@@ -32,14 +46,67 @@ def client() -> Generator[TestClient, None, None]:
         yield c
 
 
+@pytest_asyncio.fixture(scope="session")
+async def async_client() -> AsyncGenerator[AsyncClient, None]:
+    # one client for the whole suite on the session event loop, the app
+    # lifespan creates the shared super client the routes depend on
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as c:
+            yield c
+
+
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def warmup(async_client: AsyncClient) -> None:
+    # build the OpenAPI schema and run the request validation error path once
+    # per worker, so the first timed test does not pay for it. The login body
+    # fails validation and never reaches supabase
+    await async_client.get(f"{settings.API_V1_STR}/openapi.json")
+    await async_client.post(
+        f"{settings.API_V1_STR}/auth/login", json={"email": "x@x", "password": "x"}
+    )
+
+
+@pytest.fixture(scope="function")
+def null_email_auth() -> Generator[NullEmailAuth, None]:
+    # routes get a super client whose auth only records outgoing emails
+    auth = NullEmailAuth()
+    app.dependency_overrides[get_super_client] = lambda: SimpleNamespace(auth=auth)
+    yield auth
+    app.dependency_overrides.pop(get_super_client, None)
+
+
+@pytest.fixture(scope="function")
+def fake_gotrue(monkeypatch: pytest.MonkeyPatch) -> Generator[FakeGoTrue, None]:
+    # token lookups go to the fake, the module level token caches start and
+    # end empty so no test sees a user another one cached
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "")
+    _user_cache.clear()
+    _user_lookups.clear()
+    yield FakeGoTrue()
+    _user_cache.clear()
+    _user_lookups.clear()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def disable_rate_limit() -> Generator[None, None]:
+    # the suite signs up and logs in far more often than the limits allow
+    settings.RATE_LIMIT_ENABLED = False
+    yield
+    settings.RATE_LIMIT_ENABLED = True
+
+
 @pytest.fixture(scope="session", autouse=True)
 def global_cleanup() -> Generator[None, None]:
     yield
-    # Clean up all users
+    # Clean up the users this worker created, other xdist workers may still
+    # be using theirs
     super_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
     users = super_client.auth.admin.list_users()
     for user in users:
-        super_client.auth.admin.delete_user(user.id)
+        if user.email and user.email.startswith(TEST_EMAIL_PREFIX):
+            super_client.auth.admin.delete_user(user.id)
 
 
 @pytest.fixture(scope="function")
@@ -54,7 +121,7 @@ fake = Faker()
 @pytest.fixture(scope="function")
 def test_user(super_client: Client) -> Generator[User, None]:
     response = super_client.auth.sign_up(
-        {"email": fake.email(), "password": "testpassword123"}
+        {"email": random_email(), "password": "testpassword123"}
     )
     yield response.user
 
@@ -70,32 +137,36 @@ def test_item(db: Session, test_user: User) -> Generator[Item, None]:
 @pytest.fixture(scope="function")
 def token(super_client: Client) -> Generator[Token, None]:
     response = super_client.auth.sign_up(
-        {"email": fake.email(), "password": "testpassword123"}
+        {"email": random_email(), "password": "testpassword123"}
     )
     yield Token(access_token=response.session.access_token)
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def test_user_email() -> str:
-    return fake.email()
+    return random_email()
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def test_user_password() -> str:
     return "testpassword123"
 
 
-@pytest.fixture(scope="function")
-def test_access_token(super_client: Client, test_user_email: str, test_user_password: str) -> str:
+@pytest.fixture(scope="session")
+def test_user_session(test_user_email: str, test_user_password: str) -> AuthSession:
+    # signed up once and shared by the login, me, logout and refresh tests
+    super_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
     response = super_client.auth.sign_up(
         {"email": test_user_email, "password": test_user_password}
     )
-    return response.session.access_token
+    return response.session
 
 
-@pytest.fixture(scope="function")
-def test_refresh_token(super_client: Client, test_user_email: str, test_user_password: str) -> str:
-    response = super_client.auth.sign_up(
-        {"email": test_user_email, "password": test_user_password}
-    )
-    return response.session.refresh_token
+@pytest.fixture(scope="session")
+def test_access_token(test_user_session: AuthSession) -> str:
+    return test_user_session.access_token
+
+
+@pytest.fixture(scope="session")
+def test_refresh_token(test_user_session: AuthSession) -> str:
+    return test_user_session.refresh_token
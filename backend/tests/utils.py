@@ -1,7 +1,67 @@
+import asyncio
+import os
+import uuid
+from types import SimpleNamespace
+from typing import Any
+
 from fastapi import HTTPException
+from gotrue import User
 
 
 def get_auth_header(access_token: str | None) -> dict[str, str]:
     if not access_token:
         raise HTTPException(status_code=401, detail="No access token")
     return {"Authorization": f"Bearer {access_token}"}
+
+
+# under pytest-xdist every worker has its own id, "main" when run serially
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "main")
+TEST_EMAIL_PREFIX = f"test_{WORKER_ID}_"
+
+
+def random_email() -> str:
+    """email unique across runs and xdist workers, owned by this worker"""
+    return f"{TEST_EMAIL_PREFIX}{uuid.uuid4().hex}@example.com"
+
+
+class NullEmailAuth:
+    """auth client stand-in recording reset emails instead of sending them"""
+
+    def __init__(self) -> None:
+        self.reset_emails: list[str] = []
+
+    async def reset_password_for_email(self, email: str, options: Any = None) -> None:
+        self.reset_emails.append(email)
+
+
+class FakeGoTrue:
+    """gotrue stand-in for the super client, get_user answers with `user`
+    after `delay` seconds unless an error is queued in `errors`"""
+
+    def __init__(self) -> None:
+        self.user = User(
+            id="5f7e2b6a-1111-2222-3333-444455556666",
+            app_metadata={},
+            user_metadata={},
+            aud="authenticated",
+            created_at="2024-01-01T00:00:00Z",
+        )
+        self.delay = 0.0
+        self.errors: list[Exception] = []
+        self.calls: list[str] = []
+        self.requests: list[tuple[str, str, dict[str, Any]]] = []
+        self.client = SimpleNamespace(auth=self)
+        # request whose app state holds the fake super client
+        state = SimpleNamespace(super_client=self.client)
+        self.request = SimpleNamespace(app=SimpleNamespace(state=state))
+
+    async def get_user(self, jwt: str) -> SimpleNamespace:
+        self.calls.append(jwt)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(user=self.user)
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> None:
+        self.requests.append((method, path, kwargs))